@@ -3,114 +3,161 @@ Cache information and management utility for NaviSync.
 Run this script to view cache statistics or perform cache maintenance.
 """
 
+import cmd
 import sys
-from src.config import CACHE_DB_PATH
-from src.cache import ScrobbleCache
+from contextlib import closing
 
-def print_cache_info():
+SEPARATOR = "=" * 60
+MENU = "\n".join([
+    "\nNaviSync Cache Management",
+    SEPARATOR,
+    "1. View cache statistics (info)",
+    "2. View fuzzy match mappings (fuzzy)",
+    "3. Reset sync status, force full re-sync (reset)",
+    "4. Exit (exit)",
+    SEPARATOR,
+])
+
+def open_cache():
+    """Open the scrobble cache.
+
+    Imports are deferred so the usage path doesn't load .env or SQLite.
+    """
+    from src.config import CACHE_DB_PATH
+    from src.cache import ScrobbleCache
+    return ScrobbleCache(CACHE_DB_PATH)
+
+def print_cache_info(cache):
     """Display detailed cache information."""
-    cache = ScrobbleCache(CACHE_DB_PATH)
     stats = cache.get_cache_stats()
     
-    print("=" * 60)
-    print("NaviSync Cache Statistics")
-    print("=" * 60)
+    # Build the whole report and write it in one go
+    lines = [SEPARATOR, "NaviSync Cache Statistics", SEPARATOR]
     
     if stats['total_scrobbles'] == 0:
-        print("\n❌ Cache is empty. Run main.py to populate the cache.\n")
+        lines.append("\n❌ Cache is empty. Run main.py to populate the cache.\n")
+        print("\n".join(lines))
         return
     
-    print(f"\n📊 Scrobbles:")
-    print(f"  Total cached: {stats['total_scrobbles']:,}")
-    print(f"  Synced to Navidrome: {stats['synced_scrobbles']:,}")
-    print(f"  Unsynced: {stats['unsynced_scrobbles']:,}")
-    
-    print(f"\n❤️  Loved tracks: {stats['loved_tracks']:,}")
+    lines += [
+        f"\n📊 Scrobbles:",
+        f"  Total cached: {stats['total_scrobbles']:,}",
+        f"  Synced to Navidrome: {stats['synced_scrobbles']:,}",
+        f"  Unsynced: {stats['unsynced_scrobbles']:,}",
+        f"\n❤️  Loved tracks: {stats['loved_tracks']:,}",
+    ]
     
     # Show fuzzy match mappings
-    fuzzy_matches = cache.get_all_fuzzy_matches()
-    if fuzzy_matches:
-        print(f"\n🔍 Fuzzy match mappings: {len(fuzzy_matches):,}")
-        print("  (These are remembered track matches between Last.fm and Navidrome)")
+    fuzzy_match_count = cache.count_fuzzy_matches()
+    if fuzzy_match_count:
+        lines.append(f"\n🔍 Fuzzy match mappings: {fuzzy_match_count:,}")
+        lines.append("  (These are remembered track matches between Last.fm and Navidrome)")
     
-    print(f"\n📅 Date range:")
-    print(f"  Oldest scrobble: {stats['oldest_scrobble']}")
-    print(f"  Newest scrobble: {stats['newest_scrobble']}")
+    lines += [
+        f"\n📅 Date range:",
+        f"  Oldest scrobble: {stats['oldest_scrobble']}",
+        f"  Newest scrobble: {stats['newest_scrobble']}",
+    ]
     
     last_sync = cache.get_metadata('last_sync_time')
     if last_sync:
-        print(f"\n🔄 Last sync: {last_sync}")
+        lines.append(f"\n🔄 Last sync: {last_sync}")
     
-    print(f"\n💾 Database location: {CACHE_DB_PATH}")
-    print("=" * 60)
-    print()
+    lines += [f"\n💾 Database location: {cache.cache_db_path}", SEPARATOR, ""]
+    print("\n".join(lines))
 
-def reset_sync_status():
+def reset_sync_status(cache):
     """Reset all tracks to unsynced status."""
     print("\n⚠️  WARNING: This will mark all cached scrobbles as unsynced.")
     print("This is useful if you want to force a full re-sync with Navidrome.")
     confirm = input("\nAre you sure you want to continue? [y/N]: ").strip().lower()
     
     if confirm == 'y':
-        cache = ScrobbleCache(CACHE_DB_PATH)
         cache.reset_sync_status()
         print("✅ All scrobbles marked as unsynced. Run main.py to re-sync.\n")
     else:
         print("❌ Cancelled.\n")
 
-def show_fuzzy_matches():
+def show_fuzzy_matches(cache):
     """Display all saved fuzzy match mappings."""
-    cache = ScrobbleCache(CACHE_DB_PATH)
-    mappings = cache.get_all_fuzzy_matches()
+    total = cache.count_fuzzy_matches()
     
-    if not mappings:
+    if not total:
         print("\n📭 No fuzzy match mappings saved yet.\n")
         return
     
-    print(f"\n🔍 Fuzzy Match Mappings ({len(mappings)} total)")
-    print("=" * 60)
+    print(f"\n🔍 Fuzzy Match Mappings ({total} total)")
+    print(SEPARATOR)
     print("\nThese are tracks that were manually matched and will be")
     print("automatically matched in future runs:\n")
     
-    for i, m in enumerate(mappings, 1):
+    for i, m in enumerate(cache.iter_fuzzy_matches(), 1):
         print(f"{i}. Navidrome: {m['navidrome_artist']} - {m['navidrome_track']}")
         print(f"   → Last.fm: {m['lastfm_artist']} - {m['lastfm_track']}\n")
     
-    print("=" * 60)
+    print(SEPARATOR)
     print()
 
-def show_menu():
-    """Display interactive menu."""
-    print("\nNaviSync Cache Management")
-    print("=" * 60)
-    print("1. View cache statistics")
-    print("2. View fuzzy match mappings")
-    print("3. Reset sync status (force full re-sync)")
-    print("4. Exit")
-    print("=" * 60)
-    
-    choice = input("\nSelect an option [1-4]: ").strip()
-    
-    if choice == '1':
-        print_cache_info()
-    elif choice == '2':
-        show_fuzzy_matches()
-    elif choice == '3':
-        reset_sync_status()
-    elif choice == '4':
+class CacheShell(cmd.Cmd):
+    """Interactive cache management menu.
+
+    Commands can be entered by name or by their menu number.
+    """
+    intro = MENU
+    prompt = "\nSelect an option [1-4]: "
+    # Menu numbers -> command names
+    aliases = {'1': 'info', '2': 'fuzzy', '3': 'reset', '4': 'exit'}
+    
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+    
+    def do_info(self, _):
+        """View cache statistics"""
+        print_cache_info(self.cache)
+    
+    def do_fuzzy(self, _):
+        """View fuzzy match mappings"""
+        show_fuzzy_matches(self.cache)
+    
+    def do_reset(self, _):
+        """Reset sync status (force full re-sync)"""
+        reset_sync_status(self.cache)
+    
+    def do_exit(self, _):
+        """Exit"""
         print("Goodbye!\n")
-        sys.exit(0)
-    else:
+        return True
+    
+    do_EOF = do_exit
+    
+    def postcmd(self, stop, line):
+        # Show the options again before every prompt, like the first one
+        if not stop:
+            print(MENU)
+        return stop
+    
+    def emptyline(self):
+        # Don't repeat the last command (e.g. a reset) on a bare Enter
+        pass
+    
+    def default(self, line):
+        command = self.aliases.get(line.strip().lower())
+        if command:
+            return self.onecmd(command)
         print("❌ Invalid option. Please try again.\n")
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] in ['--info', '-i']:
-            print_cache_info()
+            with closing(open_cache()) as cache:
+                print_cache_info(cache)
         elif sys.argv[1] in ['--reset', '-r']:
-            reset_sync_status()
+            with closing(open_cache()) as cache:
+                reset_sync_status(cache)
         elif sys.argv[1] in ['--fuzzy', '-f']:
-            show_fuzzy_matches()
+            with closing(open_cache()) as cache:
+                show_fuzzy_matches(cache)
         else:
             print("Usage:")
             print("  python cache_info.py           - Interactive menu")
@@ -118,10 +165,12 @@ if __name__ == "__main__":
             print("  python cache_info.py --fuzzy   - Show fuzzy match mappings")
             print("  python cache_info.py --reset   - Reset sync status")
     else:
-        # Interactive mode
+        # Interactive mode: one cache instance (and one SQLite connection) for the whole session
+        cache = open_cache()
         try:
-            while True:
-                show_menu()
+            CacheShell(cache).cmdloop()
         except KeyboardInterrupt:
             print("\n\nGoodbye!\n")
             sys.exit(0)
+        finally:
+            cache.close()
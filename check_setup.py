@@ -3,12 +3,38 @@ Quick diagnostic tool for NaviSync.
 Run this to check if your configuration is set up correctly.
 """
 
-import os
+import importlib.util
 import sys
+from pathlib import Path
+
+# Same location src.config loads .env from
+ENV_PATH = Path(__file__).resolve().parent / ".env"
+
+SEPARATOR = "=" * 60
+HEADER = f"NaviSync Diagnostic Check\n{SEPARATOR}\n"
+SUCCESS_FOOTER = (
+    f"{SEPARATOR}\n✅ All checks passed! You're ready to run NaviSync.\n{SEPARATOR}\n"
+    "\nRun: python main.py\n"
+)
+FAILURE_FOOTER = f"{SEPARATOR}\n❌ Some checks failed. Please fix the issues above.\n{SEPARATOR}\n"
+
+# Settings that must be present in .env: (config name, label, print value)
+REQUIRED_SETTINGS = (
+    ("NAVIDROME_URL", "Navidrome URL", True),
+    ("LASTFM_API_KEY", "Last.fm API key", False),
+    ("LASTFM_USER", "Last.fm user", True),
+)
+
+# Packages required at runtime: (import name, pip package name)
+REQUIRED_PACKAGES = (
+    ("requests", "requests"),
+    ("dotenv", "python-dotenv"),
+    ("tqdm", "tqdm"),
+)
 
 def check_env_file():
     """Check if .env file exists and has required variables."""
-    if not os.path.exists('.env'):
+    if not ENV_PATH.is_file():
         print("❌ No .env file found!")
         print("   → Copy env.example to .env and fill in your details.")
         return False
@@ -17,26 +43,18 @@ def check_env_file():
     
     # Try to load it
     try:
-        from src.config import NAVIDROME_URL, LASTFM_API_KEY, LASTFM_USER
+        import src.config as config
         
         issues = []
         
-        # Check Navidrome API credentials
-        if not NAVIDROME_URL:
-            issues.append("NAVIDROME_URL is not set")
-        else:
-            print(f"✅ Navidrome URL: {NAVIDROME_URL}")
-        
-        # Check Last.fm credentials
-        if not LASTFM_API_KEY:
-            issues.append("LASTFM_API_KEY is not set")
-        else:
-            print(f"✅ Last.fm API key configured")
-        
-        if not LASTFM_USER:
-            issues.append("LASTFM_USER is not set")
-        else:
-            print(f"✅ Last.fm user: {LASTFM_USER}")
+        for name, label, show_value in REQUIRED_SETTINGS:
+            value = getattr(config, name, None)
+            if not value:
+                issues.append(f"{name} is not set")
+            elif show_value:
+                print(f"✅ {label}: {value}")
+            else:
+                print(f"✅ {label} configured")
         
         if issues:
             print("\n⚠️  Issues found in .env:")
@@ -55,26 +73,14 @@ def check_dependencies():
     
     missing = []
     
-    try:
-        import requests
-        print("✅ requests is installed")
-    except ImportError:
-        print("❌ requests is not installed")
-        missing.append("requests")
-    
-    try:
-        import dotenv
-        print("✅ python-dotenv is installed") 
-    except ImportError:
-        print("❌ python-dotenv is not installed")
-        missing.append("python-dotenv")
-    
-    try:
-        import tqdm
-        print("✅ tqdm is installed")
-    except ImportError:
-        print("❌ tqdm is not installed")
-        missing.append("tqdm")
+    # Already-imported modules are known good; otherwise find_spec only
+    # locates the package, it doesn't import (and run) it
+    for module_name, package_name in REQUIRED_PACKAGES:
+        if module_name in sys.modules or importlib.util.find_spec(module_name) is not None:
+            print(f"✅ {package_name} is installed")
+        else:
+            print(f"❌ {package_name} is not installed")
+            missing.append(package_name)
     
     if missing:
         print(f"\n   → Run: pip install {' '.join(missing)}")
@@ -84,9 +90,7 @@ def check_dependencies():
     return True
 
 def main():
-    print("NaviSync Diagnostic Check")
-    print("=" * 60)
-    print()
+    print(HEADER)
     
     # Check Python version
     if sys.version_info < (3, 7):
@@ -96,25 +100,18 @@ def main():
     else:
         print(f"✅ Python {sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}")
     
-    # Check dependencies
-    deps_ok = check_dependencies()
+    # Check dependencies; config loading needs python-dotenv, so stop here if any are missing
+    if not check_dependencies():
+        print()
+        print(FAILURE_FOOTER)
+        return
     
     print("\n🔧 Checking configuration...")
     config_ok = check_env_file()
     
     print()
     
-    if deps_ok and config_ok:
-        print("=" * 60)
-        print("✅ All checks passed! You're ready to run NaviSync.")
-        print("=" * 60)
-        print("\nRun: python main.py")
-    else:
-        print("=" * 60)
-        print("❌ Some checks failed. Please fix the issues above.")
-        print("=" * 60)
-    
-    print()
+    print(SUCCESS_FOOTER if config_ok else FAILURE_FOOTER)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
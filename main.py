@@ -7,29 +7,41 @@ before running this script.
 """
 
 import sys
-import json
 import time
+from collections import defaultdict
 from datetime import datetime, timezone
 from src.config import (NAVIDROME_URL, NAVIDROME_DB_PATH, NAVIDROME_USER_ID, CACHE_DB_PATH, MISSING_SCROBBLES,
                         MISSING_LOVED, DUPLICATE_TRACKS, PLAYCOUNT_CONFLICT_RESOLUTION, SYNC_LOVED_TO_LASTFM,
                         SYNC_PLAYCOUNT, ENABLE_FUZZY_MATCHING, FUZZY_MATCHING_THRESHOLD,
                         FUZZY_MATCHING_AUTO_THRESHOLD, ALBUM_MATCHING_MODE, DUPLICATE_RESOLUTION,
                         AUTO_CONFIRM, validate_config)
-from src.lastfm import fetch_all_lastfm_scrobbles, fetch_loved_tracks, love_track
-from src.utils import aggregate_scrobbles, group_missing_by_artist_album
+from src.lastfm import fetch_all_lastfm_scrobbles, fetch_loved_tracks, love_tracks
+from src.utils import (aggregate_scrobbles, group_missing_by_artist_album, navidrome_track_key, write_json,
+                       OutputBuffer)
 from src.cache import ScrobbleCache
 from src.db import (connect_db, get_navidrome_user_id, get_all_tracks,
-                    get_annotation_playcount_starred, update_annotation,
-                    check_navidrome_active, update_artist_play_counts,
-                    update_album_play_counts)
-from src.matcher import get_lastfm_match_for_navidrome_track
+                    get_annotations_bulk, update_annotations_bulk,
+                    check_navidrome_active, update_artist_and_album_play_counts,
+                    transaction)
+from src.matcher import get_lastfm_match_for_navidrome_track, build_fuzzy_index
 from src.duplicates import (
     recompute_manual_distribution,
     calculate_album_divide,
     resolve_album_divide_selection,
     prompt_user_for_loved_selection,
+    album_label,
 )
 
+# Minimum seconds between progress line updates
+PROGRESS_INTERVAL = 0.1
+
+# Commit annotation updates in chunks of this many tracks
+ANNOTATION_COMMIT_BATCH = 1000
+
+# (play_count, starred, play_date) for tracks with no annotation row
+NO_ANNOTATION = (0, False, None)
+
+
 def print_header():
     print("\n NaviSync - Database Sync")
     print("=" * 60)
@@ -71,12 +83,9 @@ def fetch_and_update_cache(cache: ScrobbleCache):
     cache.update_loved_tracks(loved_tracks)
     print(f"✅ Updated {len(loved_tracks)} loved tracks in cache.\n")
 
-    # Get all scrobbles from cache
-    all_scrobbles = cache.get_all_scrobbles()
-    if not all_scrobbles:
+    if not cache.has_scrobbles():
         print("⚠️  No scrobbles found in cache. This might be your first run or your Last.fm account has no scrobbles.")
         print("   If this seems wrong, check your LASTFM_USER and LASTFM_API_KEY in .env file.\n")
-    return all_scrobbles
 
 
 def ensure_navidrome_stopped():
@@ -101,12 +110,19 @@ def get_navidrome_data():
 
 
 
-def _make_duplicate_key(scrobble_info):
-    """Build the key used to group duplicate Navidrome tracks for a given scrobble."""
-    if ALBUM_MATCHING_MODE == "album_aware":
-        return (scrobble_info["artist_orig"], scrobble_info["track_orig"], scrobble_info.get("album_orig", ""))
-    return (scrobble_info["artist_orig"], scrobble_info["track_orig"])
+def _tracks_with_possible_match(tracks, aggregated_scrobbles, saved_fuzzy_matches):
+    """Drop Navidrome tracks that cannot match any scrobble without fuzzy matching.
 
+    Exact matching in every album mode needs the track's artist/title key to
+    appear in the scrobbles, and saved fuzzy mappings are looked up by track ID,
+    so anything else can be skipped before the per-track matcher runs.
+    """
+    scrobbled_pairs = {(key[0], key[1]) for key in aggregated_scrobbles}
+    return [
+        t for t in tracks
+        if navidrome_track_key(t) in scrobbled_pairs
+        or str(t['id']) in saved_fuzzy_matches
+    ]
 
 
 def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
@@ -114,15 +130,18 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
     navidrome_stars_to_sync = []  # Track Navidrome stars to sync TO Last.fm
     total_tracks = len(tracks)
     tracks_with_scrobbles = 0
+    album_aware = (ALBUM_MATCHING_MODE == "album_aware")
     
     # Track potential duplicates: key = (lastfm_artist, lastfm_track), value = list of nav tracks
-    potential_duplicates = {}
+    potential_duplicates = defaultdict(list)
+    # Scrobble info for each duplicate key, from the first track that matched it
+    duplicate_scrobbles = {}
     # Always keep an album-agnostic map for loved handling in album-aware mode
-    potential_duplicates_agnostic = {}
+    potential_duplicates_agnostic = defaultdict(list)
 
     # Precompute which artist/title pairs have album-specific Last.fm scrobbles
     album_specific_keys = None
-    if ALBUM_MATCHING_MODE == "album_aware":
+    if album_aware:
         album_specific_keys = {
             (key[0], key[1])
             for key in aggregated_scrobbles.keys()
@@ -131,13 +150,27 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
 
     print(f"\n🔍 Matching {total_tracks:,} Navidrome tracks with Last.fm scrobbles...\n")
 
+    # Saved fuzzy matches, loaded once instead of queried per track
+    saved_fuzzy_matches = cache.get_fuzzy_matches_by_track_id()
+
+    # Without fuzzy matching only tracks sharing an artist/title with a scrobble can
+    # match, which is usually a small part of the library
+    if not ENABLE_FUZZY_MATCHING:
+        tracks = _tracks_with_possible_match(tracks, aggregated_scrobbles, saved_fuzzy_matches)
+        total_tracks = len(tracks)
+
+    # Normalize the scrobbles for fuzzy matching once, not once per track
+    fuzzy_index = build_fuzzy_index(aggregated_scrobbles) if ENABLE_FUZZY_MATCHING else None
+
     # Phase 1: Process all Navidrome tracks and find Last.fm matches
-    track_matches = []  # Store all matches for later processing
-    
+    next_progress = 0.0
     for i, nav_track in enumerate(tracks, 1):
-        if i % 100 == 0 or i == total_tracks:
+        now = time.monotonic()
+        if now >= next_progress or i == total_tracks:
             percentage = (i / total_tracks) * 100
-            print(f"[{i:,}/{total_tracks:,}] ({percentage:.1f}%) Processing tracks...", end='\r')
+            sys.stdout.write(f"[{i:,}/{total_tracks:,}] ({percentage:.1f}%) Processing tracks...\r")
+            sys.stdout.flush()
+            next_progress = now + PROGRESS_INTERVAL
 
         # Try to find a Last.fm match for this Navidrome track
         scrobble_info = get_lastfm_match_for_navidrome_track(
@@ -147,8 +180,10 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
             fuzzy_threshold=FUZZY_MATCHING_THRESHOLD,
             auto_fuzzy_threshold=FUZZY_MATCHING_AUTO_THRESHOLD,
             enable_fuzzy=ENABLE_FUZZY_MATCHING,
-            album_aware=(ALBUM_MATCHING_MODE == "album_aware"),
-            album_specific_keys=album_specific_keys
+            album_aware=album_aware,
+            album_specific_keys=album_specific_keys,
+            fuzzy_index=fuzzy_index,
+            saved_fuzzy_matches=saved_fuzzy_matches
         )
 
         if not scrobble_info:
@@ -156,50 +191,42 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
 
         tracks_with_scrobbles += 1
         
-        # Store the match for later processing
-        track_matches.append({
-            'nav_track': nav_track,
-            'scrobble_info': scrobble_info
-        })
-        
-        duplicate_key = _make_duplicate_key(scrobble_info)
+        # Group the match for later processing
+        agnostic_key = (scrobble_info['artist_orig'], scrobble_info['track_orig'])
+        if album_aware:
+            duplicate_key = agnostic_key + (scrobble_info.get('album_orig', ''),)
+        else:
+            duplicate_key = agnostic_key
 
-        if duplicate_key not in potential_duplicates:
-            potential_duplicates[duplicate_key] = []
+        duplicate_scrobbles.setdefault(duplicate_key, scrobble_info)
         potential_duplicates[duplicate_key].append(nav_track)
-
-        agnostic_key = (scrobble_info['artist_orig'], scrobble_info['track_orig'])
-        if agnostic_key not in potential_duplicates_agnostic:
-            potential_duplicates_agnostic[agnostic_key] = []
         potential_duplicates_agnostic[agnostic_key].append(nav_track)
     
     print(f"\n✅ Matching complete!")
     print(f"   Matched tracks: {tracks_with_scrobbles:,}\n")
+
+    # Current play counts/stars, read once for just the matched tracks
+    annotations = get_annotations_bulk(
+        conn, user_id, [t['id'] for dups in potential_duplicates.values() for t in dups]
+    )
     
     # Write duplicate tracks log
-    write_duplicate_log(potential_duplicates, album_aware=(ALBUM_MATCHING_MODE == "album_aware"))
+    write_duplicate_log(potential_duplicates, album_aware=album_aware)
     print()
     
-    # Phase 2: Handle duplicates and create differences list
-    processed_lastfm_keys = set()
+    # Phase 2: Handle duplicates and create differences list, once per Last.fm track
     love_selection_cache = {}
-    for match_info in track_matches:
-        nav_track = match_info['nav_track']
-        scrobble_info = match_info['scrobble_info']
+    # Saved duplicate selections, loaded once; refreshed divide distributions are saved together at the end
+    cache.preload_duplicate_selections()
+    refreshed_selections = []
+    # Per-track status lines are batched; flushed before every prompt
+    out = OutputBuffer()
+    for processing_key, duplicates in potential_duplicates.items():
+        scrobble_info = duplicate_scrobbles[processing_key]
         
         lastfm_artist = scrobble_info['artist_orig']
         lastfm_track = scrobble_info['track_orig']
         
-        processing_key = _make_duplicate_key(scrobble_info)
-        
-        # Skip if we've already processed this Last.fm track
-        if processing_key in processed_lastfm_keys:
-            continue
-        
-        processed_lastfm_keys.add(processing_key)
-        
-        # Check for duplicates
-        duplicates = potential_duplicates[processing_key]
         selected_track_ids = None
         album_divide_result = None
         
@@ -211,12 +238,12 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
             # Multiple versions exist, check duplicate resolution strategy
             if DUPLICATE_RESOLUTION == "ask":
                 # Check album matching mode for specific prompting logic
-                if ALBUM_MATCHING_MODE == "album_aware":
+                if album_aware:
                     scrobble_album = scrobble_info.get('album_orig', '').strip()
                     if not scrobble_album:
                         should_prompt = True
-                        print(f"\n⚠️  Album-aware mode: Last.fm scrobbles for '{lastfm_artist} - {lastfm_track}' lack album information.")
-                        print(f"   Multiple album versions found in Navidrome. Please choose which should receive these {len(scrobble_info['timestamps'])} scrobbles.")
+                        out.print(f"\n⚠️  Album-aware mode: Last.fm scrobbles for '{lastfm_artist} - {lastfm_track}' lack album information.")
+                        out.print(f"   Multiple album versions found in Navidrome. Please choose which should receive these {scrobble_info['count']} scrobbles.")
                     else:
                         should_prompt = True
                 elif ALBUM_MATCHING_MODE == "prompt":
@@ -226,15 +253,15 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
             elif DUPLICATE_RESOLUTION == "all":
                 # Automatically select all versions
                 auto_selection = [dup['id'] for dup in duplicates]
-                print(f"   📀 Auto-selecting all {len(duplicates)} versions of '{lastfm_artist} - {lastfm_track}'")
+                out.print(f"   📀 Auto-selecting all {len(duplicates)} versions of '{lastfm_artist} - {lastfm_track}'")
             elif DUPLICATE_RESOLUTION == "first":
                 # Automatically select first version
                 auto_selection = [duplicates[0]['id']]
-                album_name = duplicates[0]['album'] if duplicates[0]['album'] else "(No Album)"
-                print(f"   📀 Auto-selecting first version: {album_name} - '{lastfm_artist} - {lastfm_track}'")
+                album_name = album_label(duplicates[0]['album'])
+                out.print(f"   📀 Auto-selecting first version: {album_name} - '{lastfm_artist} - {lastfm_track}'")
             elif DUPLICATE_RESOLUTION == "skip":
                 # Skip this track entirely
-                print(f"   ⏭️  Skipping '{lastfm_artist} - {lastfm_track}' (has {len(duplicates)} versions)")
+                out.print(f"   ⏭️  Skipping '{lastfm_artist} - {lastfm_track}' (has {len(duplicates)} versions)")
                 continue
         
         # Special case for album_agnostic mode when DUPLICATE_RESOLUTION is "ask"
@@ -242,19 +269,20 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
             # In album_agnostic + ask mode, default to updating all versions
             should_prompt = False
             auto_selection = [dup['id'] for dup in duplicates]
-            print(f"   📀 Album-agnostic: updating all {len(duplicates)} versions of '{lastfm_artist} - {lastfm_track}'")
+            out.print(f"   📀 Album-agnostic: updating all {len(duplicates)} versions of '{lastfm_artist} - {lastfm_track}'")
         
         if auto_selection:
             # Automatic selection based on DUPLICATE_RESOLUTION
             selected_track_ids = auto_selection
         elif should_prompt:
+            out.flush()
             # Multiple Navidrome tracks match the same Last.fm track
             # Check if user has already made a selection for this Last.fm track
             cached_selection = cache.get_duplicate_selection(lastfm_artist, lastfm_track)
             
             if cached_selection:
                 # Use cached selection, but verify tracks still exist
-                valid_ids = [t['id'] for t in duplicates]
+                valid_ids = {t['id'] for t in duplicates}
                 cached_ids = cached_selection.get("ids", [])
                 cached_mode = cached_selection.get("mode", "select")
                 cached_distribution = cached_selection.get("distribution", None)
@@ -282,11 +310,11 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
                             album_counts=current_album_counts if current_album_counts else None
                         )
                         # Persist refreshed counts so the cache stays up-to-date
-                        cache.save_duplicate_selection(
+                        refreshed_selections.append((
                             lastfm_artist, lastfm_track,
                             list(album_divide_result.keys()),
-                            mode="divide", distribution=album_divide_result
-                        )
+                            "divide", album_divide_result
+                        ))
                 else:
                     # Cached selection no longer valid — reprompt
                     selected_track_ids, album_divide_result, skip = resolve_album_divide_selection(
@@ -330,24 +358,26 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
                         need_prompt = True
 
                     if need_prompt:
-                        starred_ids = set()
-                        for dup_track in agnostic_dups:
-                            _, nav_starred, _ = get_annotation_playcount_starred(conn, dup_track['id'], user_id)
-                            if nav_starred:
-                                starred_ids.add(dup_track['id'])
+                        out.flush()
+                        starred_ids = {
+                            dup_track['id'] for dup_track in agnostic_dups
+                            if annotations.get(dup_track['id'], NO_ANNOTATION)[1]
+                        }
 
                         love_allowed_ids = prompt_user_for_loved_selection(agnostic_dups, starred_ids)
                         cache.save_loved_selection(lastfm_artist, lastfm_track, love_allowed_ids)
 
+                    # Only used for membership checks from here on
+                    love_allowed_ids = set(love_allowed_ids)
                     love_selection_cache[agnostic_key] = love_allowed_ids
                 else:
                     love_allowed_ids = love_selection_cache[agnostic_key]
 
         # Decide which duplicates to process
         if album_divide_result is not None:
-            process_track_ids = [dup['id'] for dup in duplicates]
+            process_track_ids = {dup['id'] for dup in duplicates}
         else:
-            process_track_ids = selected_track_ids
+            process_track_ids = set(selected_track_ids)
 
         # Now process the intended track(s)
         for dup in duplicates:
@@ -355,23 +385,18 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
                 continue
 
             track_id = dup['id']
-            nav_count, nav_starred, nav_played_ts = get_annotation_playcount_starred(conn, track_id, user_id)
-            
-            track_scrobbles = scrobble_info['timestamps']
+            nav_count, nav_starred, nav_played_ts = annotations.get(track_id, NO_ANNOTATION)
             
             # If album-aware divide or manual distribution was used, use the assigned count
             if album_divide_result is not None:
                 lastfm_count = album_divide_result.get(track_id, 0)
             else:
-                lastfm_count = len(track_scrobbles)
+                lastfm_count = scrobble_info['count']
             
-            last_played = max(track_scrobbles) if track_scrobbles else None
             loved = loved_lastfm
             if love_allowed_ids is not None:
                 loved = loved and (dup['id'] in love_allowed_ids)
 
-            loved_at = cache.get_loved_timestamp(scrobble_info['artist_orig'], scrobble_info['track_orig']) if loved else None
-
             # Check if Navidrome star needs to be synced TO Last.fm
             if SYNC_LOVED_TO_LASTFM and nav_starred and not loved:
                 navidrome_stars_to_sync.append({
@@ -383,24 +408,31 @@ def compute_differences(conn, tracks, aggregated_scrobbles, user_id, cache):
 
             has_playcount_diff = SYNC_PLAYCOUNT and (lastfm_count != nav_count)
             has_loved_diff = loved and not nav_starred
-            if has_playcount_diff or has_loved_diff:
-                differences.append({
-                    'id': track_id,
-                    'artist': dup['artist'],
-                    'title': dup['title'],
-                    'album': dup['album'],
-                    'navidrome': nav_count,
-                    'nav_starred': nav_starred,
-                    'lastfm': lastfm_count,
-                    'nav_played': nav_played_ts,
-                    'last_played': last_played,
-                    'loved': loved,
-                    'loved_at': loved_at,
-                    'lastfm_artist': scrobble_info['artist_orig'],
-                    'lastfm_track': scrobble_info['track_orig'],
-                    'from_distribution': album_divide_result is not None
-                })
+            if not (has_playcount_diff or has_loved_diff):
+                continue  # Already in sync, nothing else to look up
+
+            last_played = scrobble_info['last_ts']
+            loved_at = cache.get_loved_timestamp(scrobble_info['artist_orig'], scrobble_info['track_orig']) if loved else None
 
+            differences.append({
+                'id': track_id,
+                'artist': dup['artist'],
+                'title': dup['title'],
+                'album': dup['album'],
+                'navidrome': nav_count,
+                'nav_starred': nav_starred,
+                'lastfm': lastfm_count,
+                'nav_played': nav_played_ts,
+                'last_played': last_played,
+                'loved': loved,
+                'loved_at': loved_at,
+                'lastfm_artist': scrobble_info['artist_orig'],
+                'lastfm_track': scrobble_info['track_orig'],
+                'from_distribution': album_divide_result is not None
+            })
+
+    out.flush()
+    cache.save_duplicate_selections_bulk(refreshed_selections)
     print(f"\n✅ Processing complete!")
     if navidrome_stars_to_sync:
         print(f"   Navidrome stars to sync to Last.fm: {len(navidrome_stars_to_sync)}")
@@ -445,7 +477,7 @@ def write_duplicate_log(potential_duplicates, album_aware=False):
                 "id": dup['id'],
                 "navidrome_artist": dup['artist'],
                 "navidrome_title": dup['title'],
-                "navidrome_album": dup['album'] or "(No Album)"
+                "navidrome_album": album_label(dup['album'])
             }
             if dup.get('path'):
                 version_info["path"] = dup['path']
@@ -460,8 +492,7 @@ def write_duplicate_log(potential_duplicates, album_aware=False):
         duplicate_log[log_key] = entry
     
     if duplicate_log:
-        with open(DUPLICATE_TRACKS, "w", encoding="utf-8") as f:
-            json.dump(duplicate_log, f, indent=2, ensure_ascii=False)
+        write_json(DUPLICATE_TRACKS, duplicate_log)
         print(f"📀 Duplicate tracks log saved to {DUPLICATE_TRACKS} ({len(duplicate_log)} groups)")
     
     return len(duplicate_log)
@@ -470,11 +501,9 @@ def write_duplicate_log(potential_duplicates, album_aware=False):
 def write_missing_reports(aggregated_scrobbles, tracks, cache, album_aware=False):
     print("💾 Generating missing tracks analysis from search results...")
     missing_scrobbles_grouped, missing_loved_grouped = group_missing_by_artist_album(aggregated_scrobbles, tracks, cache, album_aware)
-    with open(MISSING_SCROBBLES, "w", encoding="utf-8") as f:
-        json.dump(missing_scrobbles_grouped, f, indent=2, ensure_ascii=False)
+    write_json(MISSING_SCROBBLES, missing_scrobbles_grouped)
     print(f"✅ Missing from scrobbles saved to {MISSING_SCROBBLES}")
-    with open(MISSING_LOVED, "w", encoding="utf-8") as f:
-        json.dump(missing_loved_grouped, f, indent=2, ensure_ascii=False)
+    write_json(MISSING_LOVED, missing_loved_grouped)
     print(f"✅ Missing loved tracks saved to {MISSING_LOVED}")
 
 
@@ -507,39 +536,59 @@ def show_conflict_mode():
     print()
 
 
+def _keep_higher_playcount(nav: int, lastfm: int):
+    if lastfm > nav:
+        return lastfm, True, True
+    return nav, nav != lastfm, False
+
+
+def _use_lastfm_playcount(nav: int, lastfm: int):
+    if lastfm != nav:
+        return lastfm, True, True
+    return nav, False, False
+
+
+def _increment_playcount(nav: int, lastfm: int):
+    return nav + lastfm, nav != lastfm, True
+
+
+# Non-interactive conflict modes -> resolver returning (new_count, conflict_resolved, changed)
+PLAYCOUNT_RESOLVERS = {
+    "increment": _increment_playcount,
+    "navidrome": _keep_higher_playcount,
+    "higher": _keep_higher_playcount,
+    "lastfm": _use_lastfm_playcount,
+}
+
+
 def resolve_playcount(nav: int, lastfm: int, artist: str, title: str, mode: str):
     """Return (new_count, conflict_resolved: bool, changed: bool)."""
-    conflict = False
-    changed = False
-
-    if mode == "increment":
-        new_count = nav + lastfm
-        changed = True
-        if nav != lastfm:
-            conflict = True
-        return new_count, conflict, changed
+    resolver = PLAYCOUNT_RESOLVERS.get(mode)
+    if resolver is not None:
+        return resolver(nav, lastfm)
 
     if lastfm > nav:
         return lastfm, True, True
 
-    if nav > lastfm:
-        if mode == "ask":
-            print(f"\n🎵 {artist} - {title}")
-            print(f"   Navidrome: {nav} | Last.fm: {lastfm}")
-            choice = input("   → Navidrome playcount is higher. Keep Navidrome (N) or use Last.fm (L)? [N/L, default=N]: ").strip().lower()
-            new_count = nav if choice in ('', 'n') else lastfm
-            return new_count, True, new_count != nav
-        elif mode == "navidrome" or mode == "higher":
-            return nav, True, False
-        elif mode == "lastfm":
-            return lastfm, True, True
-        # Fallback
-        return nav, False, False
-
-    # Equal
+    if nav > lastfm and mode == "ask":
+        print(f"\n🎵 {artist} - {title}")
+        print(f"   Navidrome: {nav} | Last.fm: {lastfm}")
+        choice = input("   → Navidrome playcount is higher. Keep Navidrome (N) or use Last.fm (L)? [N/L, default=N]: ").strip().lower()
+        new_count = nav if choice in ('', 'n') else lastfm
+        return new_count, True, new_count != nav
+
+    # Equal, or an unknown mode
     return nav, False, False
 
 
+def _updated_playcount_line(artist, title, nav, lastfm, new_count):
+    return f"✅ Updated playcount: {artist} - {title} ({nav} → {new_count})"
+
+
+def _incremented_playcount_line(artist, title, nav, lastfm, new_count):
+    return f"➕ Incremented playcount: {artist} - {title} ({nav} + {lastfm} = {new_count})"
+
+
 def prompt_yes_no(message: str, default: bool = False) -> bool:
     resp = input(message).strip().lower()
     if not resp:
@@ -547,15 +596,25 @@ def prompt_yes_no(message: str, default: bool = False) -> bool:
     return resp in ("y", "yes")
 
 
+def _format_difference(d):
+    """Two-line listing entry for one difference, newline-terminated."""
+    album_info = f" [{d['album']}]" if d.get('album') else ""
+    return (
+        f"  - {d['artist']} - {d['title']}{album_info}\n"
+        f"    Navidrome: {d['navidrome']} | Last.fm: {d['lastfm']} | "
+        f"Diff: {d['lastfm'] - d['navidrome']:+d} | Loved: {d['loved']}\n"
+    )
+
+
 def apply_updates(conn, cache: ScrobbleCache, differences, user_id: int):
     print(f"\nTracks with possible updates: {len(differences)}\n")
     show_conflict_mode()
 
-    for d in differences:
-        diff_str = f"{d['lastfm'] - d['navidrome']:+d}"
-        album_info = f" [{d['album']}]" if d.get('album') else ""
-        print(f"  - {d['artist']} - {d['title']}{album_info}")
-        print(f"    Navidrome: {d['navidrome']} | Last.fm: {d['lastfm']} | Diff: {diff_str} | Loved: {d['loved']}")
+    # Build the whole listing first and write it in one go
+    sys.stdout.write("".join(map(_format_difference, differences)))
+    sys.stdout.flush()
+
+    out = OutputBuffer()
 
     if AUTO_CONFIRM:
         print("\n⚡ AUTO_CONFIRM is enabled, proceeding automatically.")
@@ -569,11 +628,13 @@ def apply_updates(conn, cache: ScrobbleCache, differences, user_id: int):
     updated_track_ids = []  # Track which tracks were updated
     all_processed_track_ids = []  # Track all tracks processed (for aggregation)
 
+    # Pass 1: decide every track's new play count up front, so any conflict
+    # prompts are answered before the database write transaction starts
+    planned = []  # (difference, new_count, will_update_loved)
     for d in differences:
         nav = d['navidrome']
         lastfm = d['lastfm']
-        artist, title = d['artist'], d['title']
-        
+
         all_processed_track_ids.append(d['id'])  # Track this for later aggregation
 
         # If play count sync is disabled, leave counts untouched
@@ -588,8 +649,8 @@ def apply_updates(conn, cache: ScrobbleCache, differences, user_id: int):
             conflict = nav != lastfm
             changed = new_count != nav
         else:
-            new_count, conflict, changed = resolve_playcount(nav, lastfm, artist, title, PLAYCOUNT_CONFLICT_RESOLUTION)
-        
+            new_count, conflict, changed = resolve_playcount(nav, lastfm, d['artist'], d['title'], PLAYCOUNT_CONFLICT_RESOLUTION)
+
         if conflict:
             conflicts_resolved += 1
         if changed:
@@ -605,24 +666,68 @@ def apply_updates(conn, cache: ScrobbleCache, differences, user_id: int):
         if track_was_updated:
             updated_track_ids.append(d['id'])
 
-        update_annotation(conn, d['id'], new_count, d['last_played'], d['loved'], user_id, loved_at=d.get('loved_at'))
-
-        # Mark this track as synced in cache using original Last.fm names
-        lastfm_artist = d.get('lastfm_artist', d['artist'])
-        lastfm_track = d.get('lastfm_track', d['title'])
-        cache.mark_scrobbles_synced(lastfm_artist, lastfm_track)
+        planned.append((d, new_count, will_update_loved))
+
+    # Pass 2: write the decisions in batches, without stopping for input
+    pending_rows = []  # Annotation writes awaiting the next batch flush
+    synced_pairs = []  # Last.fm (artist, track) pairs awaiting the next commit
+    seen_pairs = set()  # Pairs already queued this run; album versions share one pair
+
+    def write_batch():
+        # One transaction per chunk instead of per track; the cache is only
+        # marked synced once the matching Navidrome writes are committed
+        with transaction(conn):
+            update_annotations_bulk(conn, user_id, pending_rows)
+        cache.mark_scrobbles_synced_bulk(synced_pairs)
+        pending_rows.clear()
+        synced_pairs.clear()
+
+    # The conflict mode is fixed for the run, so pick the log format once
+    if PLAYCOUNT_CONFLICT_RESOLUTION == "increment":
+        playcount_line = _incremented_playcount_line
+    else:
+        playcount_line = _updated_playcount_line
+    report_kept_counts = PLAYCOUNT_CONFLICT_RESOLUTION != "ask"
 
-        # Log concise summary
-        if new_count != nav:
-            if PLAYCOUNT_CONFLICT_RESOLUTION == "increment":
-                print(f"➕ Incremented playcount: {artist} - {title} ({nav} + {lastfm} = {new_count})")
-            else:
-                print(f"✅ Updated playcount: {artist} - {title} ({nav} → {new_count})")
-        elif will_update_loved:
-            print(f"⭐ Starred: {artist} - {title}")
-        elif PLAYCOUNT_CONFLICT_RESOLUTION != "ask" and nav > lastfm:
-            # Show when we kept Navidrome's higher count (non-interactive modes)
-            print(f"ℹ️  Kept Navidrome count: {artist} - {title} (Navidrome: {nav}, Last.fm: {lastfm})")
+    try:
+        for d, new_count, will_update_loved in planned:
+            nav = d['navidrome']
+            lastfm = d['lastfm']
+            artist, title = d['artist'], d['title']
+
+            # Skip the write when Navidrome would end up unchanged: same count,
+            # no new star and no newer play date
+            last_played = d['last_played']
+            unchanged = (
+                new_count == nav and not will_update_loved
+                and (not last_played or (d['nav_played'] and last_played <= d['nav_played']))
+            )
+            if not unchanged:
+                pending_rows.append((d['id'], new_count, last_played, d['loved'], d.get('loved_at')))
+
+            # Mark this track as synced in cache using original Last.fm names
+            lastfm_artist = d.get('lastfm_artist', d['artist'])
+            lastfm_track = d.get('lastfm_track', d['title'])
+            pair = (lastfm_artist, lastfm_track)
+            if pair not in seen_pairs:
+                seen_pairs.add(pair)
+                synced_pairs.append(pair)
+
+            # Log concise summary
+            if new_count != nav:
+                out.print(playcount_line(artist, title, nav, lastfm, new_count))
+            elif will_update_loved:
+                out.print(f"⭐ Starred: {artist} - {title}")
+            elif report_kept_counts and nav > lastfm:
+                # Show when we kept Navidrome's higher count (non-interactive modes)
+                out.print(f"ℹ️  Kept Navidrome count: {artist} - {title} (Navidrome: {nav}, Last.fm: {lastfm})")
+
+            if len(pending_rows) >= ANNOTATION_COMMIT_BATCH:
+                write_batch()
+        if pending_rows or synced_pairs:
+            write_batch()
+    finally:
+        out.flush()
 
     # Update sync timestamp
     cache.set_metadata('last_sync_time', datetime.now(timezone.utc).isoformat())
@@ -630,8 +735,7 @@ def apply_updates(conn, cache: ScrobbleCache, differences, user_id: int):
     # Update artist and album play counts for all processed tracks (includes duplicates)
     # This ensures complete aggregation even if some duplicates didn't change
     print("\n🎨 Updating artist and album play counts...")
-    artists_updated = update_artist_play_counts(conn, user_id, all_processed_track_ids)
-    albums_updated = update_album_play_counts(conn, user_id, all_processed_track_ids)
+    artists_updated, albums_updated = update_artist_and_album_play_counts(conn, user_id, all_processed_track_ids)
     print(f"✅ Updated play counts for {artists_updated} artists and {albums_updated} albums")
 
     # Show summary
@@ -646,13 +750,18 @@ def apply_updates(conn, cache: ScrobbleCache, differences, user_id: int):
 
 
 def close_db(conn):
+    print("🔒 Closing database connection...")
     try:
+        # Fold any WAL content back into the main file so Navidrome starts from a
+        # clean database; a no-op when the database isn't in WAL mode
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except Exception:
+        pass
+    try:
+        # SQLite releases its file locks synchronously on close, no need to wait
         conn.close()
     except Exception:
         pass
-    # Wait 2 seconds to ensure database connection is fully released
-    print("🔒 Closing database connection...")
-    time.sleep(2)
 
 
 def sync_stars_to_lastfm(navidrome_stars_to_sync, cache):
@@ -715,14 +824,11 @@ def sync_stars_to_lastfm(navidrome_stars_to_sync, cache):
     synced_count = 0
     failed_count = 0
     
-    for track_info in to_sync:
-        artist = track_info['artist']
-        track = track_info['track']
-        
-        if love_track(artist, track):
+    results = love_tracks([(t['artist'], t['track']) for t in to_sync])
+    for track_info, loved in zip(to_sync, results):
+        if loved:
             synced_count += 1
             print(f"  ❤️  Loved on Last.fm: {track_info['nav_artist']} - {track_info['nav_track']}")
-            time.sleep(0.5)  # Rate limiting
         else:
             failed_count += 1
     
@@ -731,19 +837,17 @@ def sync_stars_to_lastfm(navidrome_stars_to_sync, cache):
         print(f"⚠️  Failed to sync {failed_count} tracks")
 
 
-def main():
-    """Main sync function using direct database access."""
-    validate_config()
-    print_header()
+def run_sync(cache):
+    """Fetch scrobbles, match them against Navidrome and apply the updates."""
     try:
-        cache = ScrobbleCache(CACHE_DB_PATH)
         show_cache_stats(cache)
-        all_scrobbles = fetch_and_update_cache(cache)
+        fetch_and_update_cache(cache)
         ensure_navidrome_stopped()
         user_id, tracks = get_navidrome_data()
         if not tracks:
             return
-        aggregated_scrobbles = aggregate_scrobbles(all_scrobbles, album_aware=(ALBUM_MATCHING_MODE == "album_aware"))
+        # Stream rows from the cache straight into the aggregation
+        aggregated_scrobbles = aggregate_scrobbles(cache.iter_scrobble_groups(), album_aware=(ALBUM_MATCHING_MODE == "album_aware"))
     except KeyboardInterrupt:
         print("\n\n⚠️  Sync cancelled by user.")
         return
@@ -770,5 +874,22 @@ def main():
     finally:
         close_db(conn)
 
+
+def main():
+    """Main sync function using direct database access."""
+    validate_config()
+    print_header()
+    try:
+        cache = ScrobbleCache(CACHE_DB_PATH)
+    except Exception as e:
+        print(f"\n❌ Error during initialization: {e}")
+        return
+    try:
+        run_sync(cache)
+    finally:
+        # The cache keeps one connection open for the whole run; closing it
+        # checkpoints the WAL and removes the -wal/-shm files
+        cache.close()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
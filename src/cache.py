@@ -5,9 +5,23 @@ from datetime import datetime, timezone
 
 
 class ScrobbleCache:
+    # Applied once when the shared connection is opened. WAL lets readers
+    # (e.g. cache_info.py) run while main.py is writing, and NORMAL sync is
+    # safe under WAL while avoiding an fsync on every commit.
+    _PRAGMAS = (
+        "journal_mode=WAL",
+        "synchronous=NORMAL",
+        "busy_timeout=5000",
+        "cache_size=-20000",
+        "temp_store=MEMORY",
+    )
+
     def __init__(self, cache_db_path):
         """Initialize the scrobble cache database."""
         self.cache_db_path = cache_db_path
+        self._conn = None
+        # Duplicate selections held in memory after preload_duplicate_selections()
+        self._duplicate_selections = None
         try:
             self._init_database()
         except sqlite3.Error as e:
@@ -19,12 +33,28 @@ class ScrobbleCache:
 
     @contextmanager
     def _connect(self):
-        """Open a SQLite connection, yield it, then close it."""
-        conn = sqlite3.connect(self.cache_db_path)
+        """Yield the shared SQLite connection, opening it on first use.
+
+        The connection stays open for the lifetime of the cache so repeated
+        lookups don't pay for a fresh connect each time. Uncommitted changes
+        are rolled back if the block raises.
+        """
+        if self._conn is None:
+            conn = sqlite3.connect(self.cache_db_path)
+            for pragma in self._PRAGMAS:
+                conn.execute(f"PRAGMA {pragma}")
+            self._conn = conn
         try:
-            yield conn
-        finally:
-            conn.close()
+            yield self._conn
+        except BaseException:
+            self._conn.rollback()
+            raise
+
+    def close(self):
+        """Close the shared SQLite connection, if open."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
 
     @staticmethod
     def _normalize_lookup_key(value):
@@ -188,19 +218,31 @@ class ScrobbleCache:
             conn.commit()
         return added_count
 
-    def get_all_scrobbles(self):
-        """Get all scrobbles from cache in the same format as Last.fm API."""
+    def has_scrobbles(self):
+        """Return True if the cache holds at least one scrobble."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM scrobbles)")
+            return bool(cursor.fetchone()[0])
+
+    def iter_scrobble_groups(self):
+        """Yield scrobbles grouped by exact artist/album/track, most recently played first.
+
+        Each group is a scrobble dict whose 'timestamp' is the latest play and
+        'count' the number of scrobbles in it, so aggregate_scrobbles() can
+        consume it without every scrobble row being loaded into Python.
+        """
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT artist, album, track, timestamp, loved
+                SELECT artist, album, track, COUNT(*), MAX(timestamp), MAX(loved)
                 FROM scrobbles
-                ORDER BY timestamp DESC
+                GROUP BY artist, album, track
+                ORDER BY MAX(timestamp) DESC
             """)
-            return [
-                {'artist': r[0], 'album': r[1] or '', 'track': r[2], 'timestamp': r[3], 'loved': bool(r[4])}
-                for r in cursor.fetchall()
-            ]
+        for r in cursor:
+            yield {'artist': r[0], 'album': r[1] or '', 'track': r[2], 'count': r[3],
+                   'timestamp': r[4], 'loved': bool(r[5])}
 
     def get_unsynced_scrobbles(self):
         """Get scrobbles that have not been synced yet."""
@@ -217,11 +259,16 @@ class ScrobbleCache:
                 for r in cursor.fetchall()
             ]
 
-    def mark_scrobbles_synced(self, artist, track):
-        """Mark all scrobbles for a given artist/track as synced."""
+    def mark_scrobbles_synced_bulk(self, pairs):
+        """Mark all scrobbles for each (artist, track) pair as synced in one transaction.
+
+        Accepts any iterable of pairs; nothing is written if it is empty.
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return
         with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE scrobbles SET synced = 1 WHERE artist = ? AND track = ?", (artist, track))
+            conn.executemany("UPDATE scrobbles SET synced = 1 WHERE artist = ? AND track = ?", pairs)
             conn.commit()
 
     def get_scrobble_count(self, artist, track):
@@ -320,14 +367,17 @@ class ScrobbleCache:
         """Get statistics about the cache."""
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM scrobbles")
-            total_scrobbles = cursor.fetchone()[0]
-            cursor.execute("SELECT COUNT(*) FROM scrobbles WHERE synced = 1")
-            synced_scrobbles = cursor.fetchone()[0]
-            cursor.execute("SELECT COUNT(*) FROM loved_tracks")
-            loved_count = cursor.fetchone()[0]
-            cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM scrobbles")
-            min_ts, max_ts = cursor.fetchone()
+            # Single pass over scrobbles for all counters; the date range comes
+            # from standalone MIN/MAX subqueries so each is an idx_timestamp probe
+            cursor.execute("""
+                SELECT COUNT(*),
+                       COALESCE(SUM(synced = 1), 0),
+                       (SELECT COUNT(*) FROM loved_tracks),
+                       (SELECT MIN(timestamp) FROM scrobbles),
+                       (SELECT MAX(timestamp) FROM scrobbles)
+                FROM scrobbles
+            """)
+            total_scrobbles, synced_scrobbles, loved_count, min_ts, max_ts = cursor.fetchone()
 
         return {
             'total_scrobbles': total_scrobbles,
@@ -344,6 +394,8 @@ class ScrobbleCache:
             cursor = conn.cursor()
             cursor.execute("UPDATE scrobbles SET synced = 0")
             conn.commit()
+            # Rewriting every row skews the planner stats; refresh them where needed
+            conn.execute("PRAGMA optimize")
 
     # ------------------------------------------------------------------
     # Fuzzy match mappings
@@ -366,6 +418,16 @@ class ScrobbleCache:
             return {'artist': result[0], 'track': result[1]}
         return None
 
+    def get_fuzzy_matches_by_track_id(self):
+        """Get every saved fuzzy match in one query.
+
+        Returns a dict of {navidrome_track_id (as string): {'artist', 'track'}}.
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT navidrome_track_id, lastfm_artist, lastfm_track FROM fuzzy_match_mappings")
+            return {str(row[0]): {'artist': row[1], 'track': row[2]} for row in cursor}
+
     def save_fuzzy_match(self, navidrome_track, lastfm_artist, lastfm_track):
         """Save a fuzzy match mapping for future runs."""
         timestamp = int(datetime.now(timezone.utc).timestamp())
@@ -389,8 +451,15 @@ class ScrobbleCache:
             ))
             conn.commit()
 
-    def get_all_fuzzy_matches(self):
-        """Get all saved fuzzy match mappings."""
+    def count_fuzzy_matches(self):
+        """Get the number of saved fuzzy match mappings."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM fuzzy_match_mappings")
+            return cursor.fetchone()[0]
+
+    def iter_fuzzy_matches(self):
+        """Yield saved fuzzy match mappings one at a time, newest first."""
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -398,16 +467,18 @@ class ScrobbleCache:
                 FROM fuzzy_match_mappings
                 ORDER BY matched_timestamp DESC
             """)
-            return [
-                {
-                    'navidrome_artist': r[0],
-                    'navidrome_track': r[1],
-                    'lastfm_artist': r[2],
-                    'lastfm_track': r[3],
-                    'matched_timestamp': r[4],
-                }
-                for r in cursor.fetchall()
-            ]
+        for r in cursor:
+            yield {
+                'navidrome_artist': r[0],
+                'navidrome_track': r[1],
+                'lastfm_artist': r[2],
+                'lastfm_track': r[3],
+                'matched_timestamp': r[4],
+            }
+
+    def get_all_fuzzy_matches(self):
+        """Get all saved fuzzy match mappings."""
+        return list(self.iter_fuzzy_matches())
 
     # ------------------------------------------------------------------
     # Skipped tracks
@@ -448,6 +519,42 @@ class ScrobbleCache:
     # Duplicate track selections
     # ------------------------------------------------------------------
 
+    @staticmethod
+    def _parse_duplicate_selection(raw):
+        """Decode a stored duplicate selection into {'mode', 'ids', 'distribution'}, or None."""
+        payload = json.loads(raw)
+        if isinstance(payload, list):
+            return {'mode': 'select', 'ids': payload, 'distribution': None}
+        if isinstance(payload, dict):
+            return {
+                'mode': payload.get('mode', 'select'),
+                'ids': payload.get('ids', []),
+                'distribution': payload.get('distribution', None),
+            }
+        return None
+
+    def get_all_duplicate_selections(self):
+        """Load every saved duplicate selection in one query.
+
+        Returns a dict of {(normalized_artist, normalized_track): selection}.
+        """
+        selections = {}
+        with self._connect() as conn:
+            cursor = conn.execute("""
+                SELECT LOWER(TRIM(lastfm_artist)), LOWER(TRIM(lastfm_track)), selected_navidrome_track_ids
+                FROM duplicate_track_selections
+            """)
+            for artist_key, track_key, raw in cursor:
+                selections.setdefault((artist_key, track_key), raw)
+        return {key: self._parse_duplicate_selection(raw) for key, raw in selections.items()}
+
+    def preload_duplicate_selections(self):
+        """Keep all duplicate selections in memory so lookups skip the database.
+
+        Selections saved afterwards through this cache instance are kept in sync.
+        """
+        self._duplicate_selections = self.get_all_duplicate_selections()
+
     def get_duplicate_selection(self, lastfm_artist, lastfm_track):
         """Get previously saved selection for duplicate tracks.
 
@@ -456,6 +563,9 @@ class ScrobbleCache:
         artist_key = self._normalize_lookup_key(lastfm_artist)
         track_key = self._normalize_lookup_key(lastfm_track)
 
+        if self._duplicate_selections is not None:
+            return self._duplicate_selections.get((artist_key, track_key))
+
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -465,37 +575,51 @@ class ScrobbleCache:
             result = cursor.fetchone()
 
         if result:
-            payload = json.loads(result[0])
-            if isinstance(payload, list):
-                return {'mode': 'select', 'ids': payload, 'distribution': None}
-            if isinstance(payload, dict):
-                return {
-                    'mode': payload.get('mode', 'select'),
-                    'ids': payload.get('ids', []),
-                    'distribution': payload.get('distribution', None),
-                }
+            return self._parse_duplicate_selection(result[0])
         return None
 
     def save_duplicate_selection(self, lastfm_artist, lastfm_track, selected_track_ids, mode="select", distribution=None):
         """Save user's selection for duplicate tracks."""
-        artist_key = self._normalize_lookup_key(lastfm_artist)
-        track_key = self._normalize_lookup_key(lastfm_track)
+        self.save_duplicate_selections_bulk(
+            [(lastfm_artist, lastfm_track, selected_track_ids, mode, distribution)]
+        )
+
+    def save_duplicate_selections_bulk(self, selections):
+        """Save several duplicate selections in one transaction.
+
+        Each entry is (lastfm_artist, lastfm_track, selected_track_ids, mode, distribution);
+        nothing is written if there are none.
+        """
         timestamp = int(datetime.now(timezone.utc).timestamp())
-        payload = {'mode': mode, 'ids': selected_track_ids, 'distribution': distribution}
+        keys = []
+        rows = []
+        for lastfm_artist, lastfm_track, selected_track_ids, mode, distribution in selections:
+            artist_key = self._normalize_lookup_key(lastfm_artist)
+            track_key = self._normalize_lookup_key(lastfm_track)
+            payload = {'mode': mode, 'ids': selected_track_ids, 'distribution': distribution}
+            keys.append((artist_key, track_key))
+            rows.append((artist_key, track_key, json.dumps(payload), timestamp))
+        if not rows:
+            return
 
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
+            cursor.executemany("""
                 DELETE FROM duplicate_track_selections
                 WHERE LOWER(TRIM(lastfm_artist)) = ? AND LOWER(TRIM(lastfm_track)) = ?
-            """, (artist_key, track_key))
-            cursor.execute("""
+            """, keys)
+            cursor.executemany("""
                 INSERT OR REPLACE INTO duplicate_track_selections
                 (lastfm_artist, lastfm_track, selected_navidrome_track_ids, selection_timestamp)
                 VALUES (?, ?, ?, ?)
-            """, (artist_key, track_key, json.dumps(payload), timestamp))
+            """, rows)
             conn.commit()
 
+        if self._duplicate_selections is not None:
+            # Round-trip through JSON so entries match what a fresh read returns
+            for key, row in zip(keys, rows):
+                self._duplicate_selections[key] = self._parse_duplicate_selection(row[2])
+
     # ------------------------------------------------------------------
     # Loved-track duplicate selections
     # ------------------------------------------------------------------
@@ -3,11 +3,13 @@ import json
 import sys
 from dotenv import load_dotenv
 
-load_dotenv()
-
 # Project root (main.py folder)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Load .env from the project root directly instead of letting dotenv search for it
+ENV_PATH = os.path.join(PROJECT_ROOT, ".env")
+load_dotenv(ENV_PATH)
+
 # Database Mode Configuration
 NAVIDROME_DB_PATH = os.getenv("NAVIDROME_DB_PATH")
 NAVIDROME_URL = os.getenv("NAVIDROME_URL")
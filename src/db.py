@@ -1,13 +1,29 @@
 import sqlite3
 import os
 import time
+from contextlib import contextmanager
 from datetime import datetime, timezone
 import requests
 
 
+# Per-connection tuning for the bulk annotation work. Navidrome is stopped while
+# we run, so durability can be relaxed. The journal mode is left as Navidrome
+# configured it since that setting persists in the database file.
+NAVIDROME_PRAGMAS = (
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-262144",     # 256 MiB page cache
+    "mmap_size=268435456",    # 256 MiB memory-mapped I/O
+    "busy_timeout=5000",
+)
+
+
 def connect_db(db_path):
     """Open a SQLite connection to the Navidrome database.
 
+    The connection is in autocommit mode (isolation_level=None): sqlite3 adds no
+    implicit BEGINs, and writes are grouped explicitly with transaction().
+
     Returns the connection on success, or None if the path is missing or the
     database cannot be opened (error is printed to stdout).
     """
@@ -15,12 +31,31 @@ def connect_db(db_path):
         print("❌ Error: NAVIDROME_DB_PATH is not configured")
         return None
     try:
-        return sqlite3.connect(db_path)
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        for pragma in NAVIDROME_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
+        return conn
     except sqlite3.Error as e:
         print(f"❌ Error connecting to Navidrome database: {e}")
         return None
 
 
+@contextmanager
+def transaction(conn):
+    """Run the block as one write transaction, rolling back if it raises.
+
+    BEGIN IMMEDIATE takes the write lock up front, so a busy database fails
+    before any work is done rather than halfway through a batch.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
 def is_database_locked(db_path, timeout=1):
     """
     Check if database is locked by attempting exclusive access.
@@ -84,22 +119,29 @@ def check_navidrome_active(db_path, check_lock=True, check_mtime=True, navidrome
 
     if navidrome_url:
         try:
-            response = requests.get(navidrome_url, timeout=3)
-            if response.status_code == 200:
+            # HEAD is enough to tell the server is up; no need to download the web UI
+            response = requests.head(navidrome_url, timeout=3, allow_redirects=True)
+            if not 200 <= response.status_code < 300:
+                # Servers and proxies don't all answer HEAD like GET (405, 404, 501...);
+                # confirm with a GET, streamed so only headers are read
+                response = requests.get(navidrome_url, timeout=3, stream=True)
+                response.close()
+            if 200 <= response.status_code < 300:
                 return True, "Navidrome is responding - server is active"
         except (requests.ConnectionError, requests.Timeout):
             pass
         except Exception:
             pass
     
-    # Check if database is locked
-    if check_lock and is_database_locked(db_path):
-        return True, "Database file is locked (Navidrome is actively accessing it)"
-    
+    # Cheapest probes first: a stat() call before actually opening the database
     # Check if database was recently modified
     if check_mtime and is_database_recently_modified(db_path):
         return True, "Database was recently modified (Navidrome is writing)"
     
+    # Check if database is locked
+    if check_lock and is_database_locked(db_path):
+        return True, "Database file is locked (Navidrome is actively accessing it)"
+    
     return False, "Navidrome appears to be inactive - safe to proceed"
 
 def get_navidrome_user_id(db_path, preset_user_id=None):
@@ -190,8 +232,10 @@ def get_all_tracks(db_path):
             FROM media_file
         """)
 
+        # Iterate the cursor so raw rows are decoded one at a time rather than
+        # holding a second full copy of the library alongside the track dicts
         tracks = []
-        for row in cursor.fetchall():
+        for row in cursor:
             raw_id = row[0]
             # Normalize id so it's JSON-serializable (prefer int when possible)
             if isinstance(raw_id, (bytes, bytearray)):
@@ -228,298 +272,385 @@ def get_all_tracks(db_path):
     finally:
         conn.close()
 
-def get_annotation_playcount_starred(conn, track_id, user_id):
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT play_count, starred, play_date
-        FROM annotation
-        WHERE user_id=? AND item_id=? AND item_type='media_file'
-    """, (user_id, track_id))
-    row = cursor.fetchone()
-    if row:
-        play_date_ts = None
-        if row[2]:
-            try:
-                dt = datetime.strptime(row[2], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-                play_date_ts = int(dt.timestamp())
-            except ValueError:
-                pass
-        return row[0] or 0, bool(row[1]), play_date_ts
-    return 0, False, None
-
-def update_annotation(conn, track_id, new_count, new_last_played, loved, user_id, loved_at=None):
-    """Update or insert annotation for a track."""
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT play_date, starred_at FROM annotation
-        WHERE user_id=? AND item_id=? AND item_type='media_file'
-    """, (user_id, track_id))
-    row = cursor.fetchone()
-    existing_play_date = None
-    if row and row[0]:
-        try:
-            dt = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-            existing_play_date = int(dt.timestamp())
-        except ValueError:
-            pass
+def _parse_play_date(play_date):
+    """Convert a Navidrome play_date string to a UTC unix timestamp, or None."""
+    if not play_date:
+        return None
+    try:
+        dt = datetime.strptime(play_date, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        return int(dt.timestamp())
+    except ValueError:
+        return None
 
-    # Only update play_date if newer or None
-    if new_last_played and (existing_play_date is None or new_last_played > existing_play_date):
-        play_date_str = datetime.fromtimestamp(new_last_played, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-    else:
-        play_date_str = row[0] if row else None
+def _track_id_key(item_id):
+    """Normalize an annotation item_id the same way get_all_tracks normalizes track ids."""
+    if isinstance(item_id, str) and item_id.isdigit():
+        return int(item_id)
+    return item_id
 
-    # Determine starred_at: only set it if loved, a timestamp is available,
-    # and starred_at is not already set in the DB (preserve manually-set dates).
-    existing_starred_at = row[1] if row else None
-    starred_at_str = existing_starred_at
-    if loved and loved_at and not existing_starred_at:
-        starred_at_str = datetime.fromtimestamp(loved_at, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+# Keep IN (...) lists under SQLite's default host-parameter limit (999 before 3.32)
+SQL_IN_CHUNK = 900
 
-    cursor.execute("""
-        SELECT 1 FROM annotation
-        WHERE user_id=? AND item_id=? AND item_type='media_file'
-    """, (user_id, track_id))
-    exists = cursor.fetchone()
-
-    if exists:
-        if loved:
-            cursor.execute("""
-                UPDATE annotation
-                SET play_count=?, play_date=?, starred=1, starred_at=?
-                WHERE user_id=? AND item_id=? AND item_type='media_file'
-            """, (new_count, play_date_str, starred_at_str, user_id, track_id))
-        else:
-            cursor.execute("""
-                UPDATE annotation
-                SET play_count=?, play_date=?
-                WHERE user_id=? AND item_id=? AND item_type='media_file'
-            """, (new_count, play_date_str, user_id, track_id))
-    else:
-        starred_val = 1 if loved else 0
-        cursor.execute("""
-            INSERT INTO annotation(user_id, item_id, item_type, play_count, play_date, starred, starred_at)
-            VALUES (?, ?, 'media_file', ?, ?, ?, ?)
-        """, (user_id, track_id, new_count, play_date_str, starred_val, starred_at_str))
-    conn.commit()
 
-def update_artist_play_counts(conn, user_id, updated_track_ids=None):
+def _chunks(items, size=SQL_IN_CHUNK):
+    """Split items into lists of at most `size` for use as IN (...) parameters."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def get_annotations_bulk(conn, user_id, track_ids=None):
+    """Get (play_count, starred, play_date_ts) for many tracks at once.
+
+    Args:
+        conn: SQLite connection to Navidrome database
+        user_id: Navidrome user ID
+        track_ids: Track IDs to look up, read in chunked IN queries. If None,
+                   every track annotation of the user is returned.
+
+    Returns a dict keyed by track id, so callers can look up tracks without a
+    query each; tracks without an annotation are absent (treat as (0, False, None)).
     """
-    Recalculate and update artist play counts by aggregating track play counts.
-    This ensures the Artist tab shows correct total plays without requiring a library scan.
-    Handles both primary artists and additional artists (multi-artist tracks).
-    
+    cursor = conn.cursor()
+    annotations = {}
+
+    if track_ids is None:
+        cursor.execute("""
+            SELECT item_id, play_count, starred, play_date
+            FROM annotation
+            WHERE user_id=? AND item_type='media_file'
+        """, (user_id,))
+        batches = [cursor]
+    else:
+        batches = []
+        for chunk in _chunks(track_ids):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"""
+                SELECT item_id, play_count, starred, play_date
+                FROM annotation
+                WHERE user_id=? AND item_type='media_file' AND item_id IN ({placeholders})
+            """, [user_id, *chunk])
+            batches.append(cursor.fetchall())
+
+    for rows in batches:
+        for item_id, play_count, starred, play_date in rows:
+            annotations[_track_id_key(item_id)] = (play_count or 0, bool(starred), _parse_play_date(play_date))
+    return annotations
+
+def _format_ts(ts):
+    """Format a unix timestamp the way Navidrome stores dates (UTC)."""
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+# Track annotation writes, each run through executemany with one row per track
+_TRACK_LOVED_UPDATE_SQL = """
+    UPDATE annotation
+    SET play_count=?, play_date=?, starred=1, starred_at=?
+    WHERE user_id=? AND item_id=? AND item_type='media_file'
+"""
+_TRACK_UPDATE_SQL = """
+    UPDATE annotation
+    SET play_count=?, play_date=?
+    WHERE user_id=? AND item_id=? AND item_type='media_file'
+"""
+_TRACK_INSERT_SQL = """
+    INSERT INTO annotation(user_id, item_id, item_type, play_count, play_date, starred, starred_at)
+    VALUES (?, ?, 'media_file', ?, ?, ?, ?)
+"""
+
+def update_annotations_bulk(conn, user_id, rows):
+    """Update or insert annotations for many tracks at once.
+
     Args:
         conn: SQLite connection to Navidrome database
         user_id: Navidrome user ID
-        updated_track_ids: Optional list of track IDs that were updated. If provided, only
-                          recalculates counts for artists of these tracks. If None, updates all artists.
+        rows: List of (track_id, new_count, new_last_played, loved, loved_at) tuples
+
+    Existing annotations are read in chunked IN queries, then written with one
+    executemany per statement, so each statement is prepared once per batch.
+    Does not commit; the caller owns the transaction.
     """
+    if not rows:
+        return
     cursor = conn.cursor()
 
-    # Check once whether media_file_artists table exists for multi-artist support
+    existing = {}
+    for chunk in _chunks(row[0] for row in rows):
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f"""
+            SELECT item_id, play_date, starred_at FROM annotation
+            WHERE user_id=? AND item_type='media_file' AND item_id IN ({placeholders})
+        """, [user_id, *chunk])
+        for item_id, play_date, starred_at in cursor:
+            existing[_track_id_key(item_id)] = (play_date, starred_at)
+
+    loved_updates = []
+    plain_updates = []
+    inserts = []
+    for track_id, new_count, new_last_played, loved, loved_at in rows:
+        row = existing.get(track_id)
+        existing_play_date = _parse_play_date(row[0]) if row else None
+
+        # Only update play_date if newer or None
+        if new_last_played and (existing_play_date is None or new_last_played > existing_play_date):
+            play_date_str = _format_ts(new_last_played)
+        else:
+            play_date_str = row[0] if row else None
+
+        # Determine starred_at: only set it if loved, a timestamp is available,
+        # and starred_at is not already set in the DB (preserve manually-set dates).
+        existing_starred_at = row[1] if row else None
+        starred_at_str = existing_starred_at
+        if loved and loved_at and not existing_starred_at:
+            starred_at_str = _format_ts(loved_at)
+
+        if row:
+            if loved:
+                loved_updates.append((new_count, play_date_str, starred_at_str, user_id, track_id))
+            else:
+                plain_updates.append((new_count, play_date_str, user_id, track_id))
+        else:
+            starred_val = 1 if loved else 0
+            inserts.append((user_id, track_id, new_count, play_date_str, starred_val, starred_at_str))
+
+    if loved_updates:
+        cursor.executemany(_TRACK_LOVED_UPDATE_SQL, loved_updates)
+    if plain_updates:
+        cursor.executemany(_TRACK_UPDATE_SQL, plain_updates)
+    if inserts:
+        cursor.executemany(_TRACK_INSERT_SQL, inserts)
+
+# Artist/album annotation writes
+_AGGREGATE_DATED_UPDATE_SQL = """
+    UPDATE annotation
+    SET play_count=?, play_date=?
+    WHERE user_id=? AND item_id=? AND item_type=?
+"""
+_AGGREGATE_UPDATE_SQL = """
+    UPDATE annotation
+    SET play_count=?
+    WHERE user_id=? AND item_id=? AND item_type=?
+"""
+_AGGREGATE_INSERT_SQL = """
+    INSERT INTO annotation(user_id, item_id, item_type, play_count, play_date)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+def _write_aggregate_annotations(cursor, user_id, item_type, play_counts):
+    """Write artist or album play counts to the annotation table in bulk.
+
+    Args:
+        cursor: Cursor on the Navidrome database
+        user_id: Navidrome user ID
+        item_type: 'artist' or 'album'
+        play_counts: List of (item_id, total_plays, latest_play_date)
+
+    Existing annotations are found with one query, then updates and inserts
+    each go through a single executemany.
+    """
+    cursor.execute(
+        "SELECT item_id FROM annotation WHERE user_id=? AND item_type=?",
+        (user_id, item_type)
+    )
+    existing_ids = {row[0] for row in cursor}
+
+    dated_updates = []
+    undated_updates = []
+    inserts = []
+    for item_id, total_plays, latest_play_date in play_counts:
+        if item_id in existing_ids:
+            if latest_play_date:
+                dated_updates.append((total_plays, latest_play_date, user_id, item_id, item_type))
+            else:
+                undated_updates.append((total_plays, user_id, item_id, item_type))
+        elif total_plays > 0:
+            # Only insert if total_plays > 0
+            inserts.append((user_id, item_id, item_type, total_plays, latest_play_date))
+
+    cursor.executemany(_AGGREGATE_DATED_UPDATE_SQL, dated_updates)
+    cursor.executemany(_AGGREGATE_UPDATE_SQL, undated_updates)
+    cursor.executemany(_AGGREGATE_INSERT_SQL, inserts)
+
+def _load_temp_ids(cursor, table, ids):
+    """Fill a connection-local TEMP table with ids, replacing its previous contents.
+
+    Joining against an indexed temp table keeps large id sets out of IN (...)
+    lists, so they need neither chunking nor a temporary b-tree per query.
+    """
+    cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY)")
+    cursor.execute(f"DELETE FROM {table}")
+    cursor.executemany(f"INSERT OR IGNORE INTO {table} (id) VALUES (?)", ((i,) for i in ids))
+
+def _has_multi_artist_table(cursor):
+    """Whether this Navidrome schema has media_file_artists (multi-artist support)."""
     cursor.execute("""
-        SELECT name FROM sqlite_master 
+        SELECT name FROM sqlite_master
         WHERE type='table' AND name='media_file_artists'
     """)
-    has_multi_artist_table = cursor.fetchone() is not None
+    return cursor.fetchone() is not None
 
-    # If specific track IDs provided, get only affected artist IDs
-    affected_artist_ids = set()
-    if updated_track_ids:
-        placeholders = ','.join('?' * len(updated_track_ids))
+def _affected_artist_and_album_ids(cursor, track_ids, has_multi_artist_table):
+    """Get the artist and album IDs of the given tracks.
 
-        if has_multi_artist_table:
-            # Get all artist IDs from media_file_artists for updated tracks
-            cursor.execute(f"""
-                SELECT DISTINCT mfa.artist_id
-                FROM media_file_artists mfa
-                WHERE mfa.media_file_id IN ({placeholders})
-                    AND mfa.role = 'artist'
-                    AND mfa.artist_id IS NOT NULL
-            """, updated_track_ids)
-            affected_artist_ids.update(row[0] for row in cursor.fetchall())
-
-        # Also get primary artist_id from media_file
-        cursor.execute(f"""
-            SELECT DISTINCT artist_id
-            FROM media_file
-            WHERE id IN ({placeholders})
-                AND artist_id IS NOT NULL
-        """, updated_track_ids)
-        affected_artist_ids.update(row[0] for row in cursor.fetchall())
+    Primary artist and album come from a single media_file query; additional
+    artists come from media_file_artists when that table exists.
 
+    Returns:
+        Tuple of (artist_ids, album_ids) sets
+    """
+    artist_ids = set()
+    album_ids = set()
+    _load_temp_ids(cursor, 'temp_updated_tracks', track_ids)
+
+    if has_multi_artist_table:
+        # Get all artist IDs from media_file_artists for updated tracks
+        cursor.execute("""
+            SELECT DISTINCT mfa.artist_id
+            FROM media_file_artists mfa
+            JOIN temp_updated_tracks t ON t.id = mfa.media_file_id
+            WHERE mfa.role = 'artist'
+                AND mfa.artist_id IS NOT NULL
+        """)
+        artist_ids.update(row[0] for row in cursor)
+
+    cursor.execute("""
+        SELECT DISTINCT mf.artist_id, mf.album_id
+        FROM media_file mf
+        JOIN temp_updated_tracks t ON t.id = mf.id
+    """)
+    for artist_id, album_id in cursor:
+        if artist_id is not None:
+            artist_ids.add(artist_id)
+        if album_id is not None:
+            album_ids.add(album_id)
+
+    return artist_ids, album_ids
+
+def _recalculate_artist_play_counts(cursor, user_id, affected_artist_ids, has_multi_artist_table):
+    """Aggregate track play counts per artist and write them; returns the number of artists.
+
+    Only artists in affected_artist_ids are recalculated, or every artist when it is empty.
+    """
     artist_play_counts = {}
-    
+    if affected_artist_ids:
+        _load_temp_ids(cursor, 'temp_affected_artists', affected_artist_ids)
+
     if has_multi_artist_table:
         # Build query with optional WHERE clause for specific artists
         where_clause = ""
-        params = [user_id]
         if affected_artist_ids:
-            placeholders = ','.join('?' * len(affected_artist_ids))
-            where_clause = f"AND mfa.artist_id IN ({placeholders})"
-            params.extend(affected_artist_ids)
-        
+            where_clause = "AND mfa.artist_id IN (SELECT id FROM temp_affected_artists)"
+
         # Use media_file_artists table, filtering by role='artist' to exclude albumartist
         cursor.execute(f"""
-            SELECT 
+            SELECT
                 mfa.artist_id,
                 SUM(COALESCE(a.play_count, 0)) as total_plays,
                 MAX(a.play_date) as latest_play_date
             FROM media_file_artists mfa
             JOIN media_file mf ON mfa.media_file_id = mf.id
-            LEFT JOIN annotation a ON a.item_id = mf.id 
-                AND a.item_type = 'media_file' 
+            LEFT JOIN annotation a ON a.item_id = mf.id
+                AND a.item_type = 'media_file'
                 AND a.user_id = ?
             WHERE mfa.artist_id IS NOT NULL
                 AND mfa.role = 'artist'
                 {where_clause}
             GROUP BY mfa.artist_id
-        """, params)
-        
+        """, (user_id,))
+
         for artist_id, total_plays, latest_play_date in cursor.fetchall():
             artist_play_counts[artist_id] = (total_plays, latest_play_date)
     else:
         # Build query with optional WHERE clause for specific artists
         where_clause = ""
-        params = [user_id]
         if affected_artist_ids:
-            placeholders = ','.join('?' * len(affected_artist_ids))
-            where_clause = f"AND mf.artist_id IN ({placeholders})"
-            params.extend(affected_artist_ids)
-        
+            where_clause = "AND mf.artist_id IN (SELECT id FROM temp_affected_artists)"
+
         # Fallback to primary artist only (artist_id) if no multi-artist table exists
         cursor.execute(f"""
-            SELECT 
+            SELECT
                 mf.artist_id,
                 SUM(COALESCE(a.play_count, 0)) as total_plays,
                 MAX(a.play_date) as latest_play_date
             FROM media_file mf
-            LEFT JOIN annotation a ON a.item_id = mf.id 
-                AND a.item_type = 'media_file' 
+            LEFT JOIN annotation a ON a.item_id = mf.id
+                AND a.item_type = 'media_file'
                 AND a.user_id = ?
             WHERE mf.artist_id IS NOT NULL
                 {where_clause}
             GROUP BY mf.artist_id
-        """, params)
-        
+        """, (user_id,))
+
         for artist_id, total_plays, latest_play_date in cursor.fetchall():
             artist_play_counts[artist_id] = (total_plays, latest_play_date)
-    
+
     # Update each artist's play count and play_date in the annotation table
-    for artist_id, (total_plays, latest_play_date) in artist_play_counts.items():
-        # Check if artist annotation exists
-        cursor.execute("""
-            SELECT 1 FROM annotation
-            WHERE user_id=? AND item_id=? AND item_type='artist'
-        """, (user_id, artist_id))
-        
-        exists = cursor.fetchone()
-        
-        if exists:
-            if latest_play_date:
-                cursor.execute("""
-                    UPDATE annotation
-                    SET play_count=?, play_date=?
-                    WHERE user_id=? AND item_id=? AND item_type='artist'
-                """, (total_plays, latest_play_date, user_id, artist_id))
-            else:
-                cursor.execute("""
-                    UPDATE annotation
-                    SET play_count=?
-                    WHERE user_id=? AND item_id=? AND item_type='artist'
-                """, (total_plays, user_id, artist_id))
-        else:
-            # Only insert if total_plays > 0
-            if total_plays > 0:
-                cursor.execute("""
-                    INSERT INTO annotation(user_id, item_id, item_type, play_count, play_date)
-                    VALUES (?, ?, 'artist', ?, ?)
-                """, (user_id, artist_id, total_plays, latest_play_date))
-    
-    conn.commit()
+    _write_aggregate_annotations(
+        cursor, user_id, 'artist',
+        [(artist_id, total_plays, latest_play_date)
+         for artist_id, (total_plays, latest_play_date) in artist_play_counts.items()]
+    )
     return len(artist_play_counts)
 
-def update_album_play_counts(conn, user_id, updated_track_ids=None):
-    """
-    Recalculate and update album play counts by aggregating track play counts.
-    This ensures the Album tab shows correct total plays without requiring a library scan.
-    
-    Args:
-        conn: SQLite connection to Navidrome database
-        user_id: Navidrome user ID
-        updated_track_ids: Optional list of track IDs that were updated. If provided, only
-                          recalculates counts for albums of these tracks. If None, updates all albums.
+def _recalculate_album_play_counts(cursor, user_id, affected_album_ids):
+    """Aggregate track play counts per album and write them; returns the number of albums.
+
+    Only albums in affected_album_ids are recalculated, or every album when it is empty.
     """
-    cursor = conn.cursor()
-    
-    # If specific track IDs provided, get only affected album IDs
-    affected_album_ids = set()
-    if updated_track_ids:
-        placeholders = ','.join('?' * len(updated_track_ids))
-        cursor.execute(f"""
-            SELECT DISTINCT album_id
-            FROM media_file
-            WHERE id IN ({placeholders})
-                AND album_id IS NOT NULL
-        """, updated_track_ids)
-        affected_album_ids.update(row[0] for row in cursor.fetchall())
-    
     # Build query with optional WHERE clause for specific albums
     where_clause = ""
-    params = [user_id]
     if affected_album_ids:
-        placeholders = ','.join('?' * len(affected_album_ids))
-        where_clause = f"AND mf.album_id IN ({placeholders})"
-        params.extend(affected_album_ids)
-    
+        _load_temp_ids(cursor, 'temp_affected_albums', affected_album_ids)
+        where_clause = "AND mf.album_id IN (SELECT id FROM temp_affected_albums)"
+
     # Get albums and their total play counts and latest play date from tracks
     cursor.execute(f"""
-        SELECT 
+        SELECT
             mf.album_id,
             SUM(COALESCE(a.play_count, 0)) as total_plays,
             MAX(a.play_date) as latest_play_date
         FROM media_file mf
-        LEFT JOIN annotation a ON a.item_id = mf.id 
-            AND a.item_type = 'media_file' 
+        LEFT JOIN annotation a ON a.item_id = mf.id
+            AND a.item_type = 'media_file'
             AND a.user_id = ?
         WHERE mf.album_id IS NOT NULL
             {where_clause}
         GROUP BY mf.album_id
-    """, params)
-    
+    """, (user_id,))
+
     album_play_counts = cursor.fetchall()
-    
+
     # Update each album's play count and play_date in the annotation table
-    for album_id, total_plays, latest_play_date in album_play_counts:
-        # Check if album annotation exists
-        cursor.execute("""
-            SELECT 1 FROM annotation
-            WHERE user_id=? AND item_id=? AND item_type='album'
-        """, (user_id, album_id))
-        
-        exists = cursor.fetchone()
-        
-        if exists:
-            if latest_play_date:
-                cursor.execute("""
-                    UPDATE annotation
-                    SET play_count=?, play_date=?
-                    WHERE user_id=? AND item_id=? AND item_type='album'
-                """, (total_plays, latest_play_date, user_id, album_id))
-            else:
-                cursor.execute("""
-                    UPDATE annotation
-                    SET play_count=?
-                    WHERE user_id=? AND item_id=? AND item_type='album'
-                """, (total_plays, user_id, album_id))
-        else:
-            # Only insert if total_plays > 0
-            if total_plays > 0:
-                cursor.execute("""
-                    INSERT INTO annotation(user_id, item_id, item_type, play_count, play_date)
-                    VALUES (?, ?, 'album', ?, ?)
-                """, (user_id, album_id, total_plays, latest_play_date))
-    
-    conn.commit()
-    return len(album_play_counts)
\ No newline at end of file
+    _write_aggregate_annotations(cursor, user_id, 'album', album_play_counts)
+    return len(album_play_counts)
+
+def update_artist_and_album_play_counts(conn, user_id, updated_track_ids=None):
+    """
+    Recalculate artist and album play counts by aggregating track play counts.
+    This keeps the Artist and Album tabs correct without requiring a library scan,
+    and covers additional artists on multi-artist tracks.
+
+    The affected artists and albums are looked up in one pass over the updated
+    tracks, and both sets of counts are written in a single transaction.
+
+    Args:
+        conn: SQLite connection to Navidrome database
+        user_id: Navidrome user ID
+        updated_track_ids: Optional list of track IDs that were updated. If None,
+                          updates all artists and albums.
+
+    Returns:
+        Tuple of (artists_updated, albums_updated)
+    """
+    cursor = conn.cursor()
+    has_multi_artist_table = _has_multi_artist_table(cursor)
+
+    affected_artist_ids = set()
+    affected_album_ids = set()
+    if updated_track_ids:
+        affected_artist_ids, affected_album_ids = _affected_artist_and_album_ids(
+            cursor, updated_track_ids, has_multi_artist_table
+        )
+
+    with transaction(conn):
+        artists_updated = _recalculate_artist_play_counts(cursor, user_id, affected_artist_ids, has_multi_artist_table)
+        albums_updated = _recalculate_album_play_counts(cursor, user_id, affected_album_ids)
+    return artists_updated, albums_updated
@@ -5,9 +5,33 @@ All functions that prompt the user to resolve duplicate Navidrome tracks,
 distribute scrobbles across album versions, and cache those decisions live here.
 """
 
+from collections import namedtuple
+
 # Sentinel returned by album-assignment prompts to signal "use album-aware divide"
 _DIVIDE = "DIVIDE"
 
+# Shown in place of an empty album name
+NO_ALBUM = "(No Album)"
+
+
+def album_label(album):
+    """Display name for an album, NO_ALBUM when it is empty."""
+    return album or NO_ALBUM
+
+
+def format_duration(seconds):
+    """Track length as m:ss, "--:--" when it is missing or not positive."""
+    if not seconds or seconds <= 0:
+        return "--:--"
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes}:{secs:02d}"
+
+
+# Outcome of prompt_user_for_duplicate_selection.
+# mode is "skip", "ids" (update the listed track ids) or "divide" (album-aware divide);
+# divide_info is the scrobble info to divide when mode is "divide", else None.
+SelectionResult = namedtuple('SelectionResult', ['mode', 'ids', 'divide_info'])
+
 
 def recompute_manual_distribution(duplicates, cached_distribution, current_album_counts):
     """
@@ -73,7 +97,7 @@ def calculate_album_divide(duplicates, scrobble_info, album_counts=None):
 
     Args:
         duplicates: List of Navidrome track versions with 'id', 'album' fields
-        scrobble_info: Dict with 'timestamps' and 'album_orig' from Last.fm
+        scrobble_info: Dict with 'count' and 'album_orig' from Last.fm
 
     Returns:
         Dict mapping track_id to calculated playcount
@@ -90,7 +114,7 @@ def calculate_album_divide(duplicates, scrobble_info, album_counts=None):
     if album_counts is not None:
         total_scrobbles = sum(album_counts.values())
         if total_scrobbles <= 0:
-            return distribute_equally(len(scrobble_info['timestamps']))
+            return distribute_equally(scrobble_info['count'])
 
         album_counts_norm = {
             (album or '').strip().lower(): count
@@ -125,24 +149,24 @@ def calculate_album_divide(duplicates, scrobble_info, album_counts=None):
         return distribute_equally(total_scrobbles)
 
     # Legacy behavior when no album counts are available
-    total_scrobbles = len(scrobble_info['timestamps'])
+    total_scrobbles = scrobble_info['count']
     lastfm_album = scrobble_info.get('album_orig', '').strip()
 
     if not lastfm_album:
         return distribute_equally(total_scrobbles)
 
-    exact_match = None
+    # Normalized album -> first version on that album
+    nav_by_album = {}
     for dup in duplicates:
-        nav_album = (dup['album'] or '').strip()
-        if nav_album.lower() == lastfm_album.lower():
-            exact_match = dup
-            break
+        nav_by_album.setdefault((dup['album'] or '').strip().lower(), dup)
+
+    exact_match = nav_by_album.get(lastfm_album.lower())
 
     if exact_match:
-        distribution = {}
-        for dup in duplicates:
-            distribution[dup['id']] = total_scrobbles if dup['id'] == exact_match['id'] else 0
-        return distribution
+        return {
+            dup['id']: total_scrobbles if dup['id'] == exact_match['id'] else 0
+            for dup in duplicates
+        }
 
     return distribute_equally(total_scrobbles)
 
@@ -200,19 +224,19 @@ def prompt_user_for_album_assignment(duplicates, album_counts, matched_albums, u
     print(f"\n⚠️  Partial album match for: {lastfm_artist} - {lastfm_track}")
     print(f"\n   ✓ Matched Last.fm → Navidrome:")
     for nav_album, lastfm_album, count in matched_albums:
-        nav_display = nav_album if nav_album else "(No Album)"
-        lastfm_display = lastfm_album if lastfm_album else "(No Album)"
+        nav_display = album_label(nav_album)
+        lastfm_display = album_label(lastfm_album)
         print(f"      {lastfm_display} ({count}) → {nav_display}")
 
     print(f"\n   ✗ Unmatched Last.fm albums (need assignment):")
     for lastfm_album, count in unmatched_albums:
-        lastfm_display = lastfm_album if lastfm_album else "(No Album)"
+        lastfm_display = album_label(lastfm_album)
         print(f"      {lastfm_display}: {count} scrobbles")
 
     print(f"\n   Where should the {total_unmatched} unmatched scrobbles go?")
 
     for idx, dup in enumerate(duplicates, 1):
-        album_info = dup['album'] if dup['album'] else "(No Album)"
+        album_info = album_label(dup['album'])
         print(f"      [{idx}] {album_info}")
 
     print(f"   [D] Album-aware divide (try to split remaining by album info)")
@@ -233,18 +257,16 @@ def prompt_user_for_album_assignment(duplicates, album_counts, matched_albums, u
             idx = int(choice)
             if 1 <= idx <= len(duplicates):
                 selected = duplicates[idx - 1]
-                album_name = selected['album'] if selected['album'] else "(No Album)"
+                album_name = album_label(selected['album'])
+
+                # Normalized Navidrome album -> count of the first Last.fm album matched to it
+                matched_counts = {}
+                for nav_album, lastfm_album, count in matched_albums:
+                    matched_counts.setdefault((nav_album or '').strip().lower(), count)
 
                 distribution = {}
                 for dup in duplicates:
-                    dup_album_norm = (dup['album'] or '').strip().lower()
-
-                    matched_count = 0
-                    for nav_album, lastfm_album, count in matched_albums:
-                        nav_norm = (nav_album or '').strip().lower()
-                        if nav_norm == dup_album_norm:
-                            matched_count = count
-                            break
+                    matched_count = matched_counts.get((dup['album'] or '').strip().lower(), 0)
 
                     if dup['id'] == selected['id']:
                         distribution[dup['id']] = matched_count + total_unmatched
@@ -278,18 +300,18 @@ def prompt_user_for_album_assignment_full_mismatch(duplicates, album_counts, las
 
     print(f"\n   Last.fm has scrobbles from:")
     for album, count in sorted(album_counts.items(), key=lambda x: x[1], reverse=True):
-        album_name = album if album else "(No Album)"
+        album_name = album_label(album)
         print(f"      • {album_name}: {count} scrobbles")
 
+    album_names = [album_label(dup['album']) for dup in duplicates]
+
     print(f"\n   Your Navidrome library has these versions:")
-    for idx, dup in enumerate(duplicates, 1):
-        album_info = dup['album'] if dup['album'] else "(No Album)"
+    for idx, album_info in enumerate(album_names, 1):
         print(f"      [{idx}] {album_info}")
 
     print(f"\n   [D] Album-aware divide (split by Last.fm album info)")
     print(f"   [S] Single version (choose which gets all scrobbles):")
-    for idx, dup in enumerate(duplicates, 1):
-        album_info = dup['album'] if dup['album'] else "(No Album)"
+    for idx, album_info in enumerate(album_names, 1):
         print(f"       [{idx}] {album_info}")
     print(f"   [0] Skip this track")
 
@@ -313,7 +335,7 @@ def prompt_user_for_album_assignment_full_mismatch(duplicates, album_counts, las
                     idx = int(idx_choice)
                     if 1 <= idx <= len(duplicates):
                         selected = duplicates[idx - 1]
-                        album_name = selected['album'] if selected['album'] else "(No Album)"
+                        album_name = album_label(selected['album'])
                         print(f"\n   ✅ All scrobbles will go to: {album_name}")
 
                         distribution = {}
@@ -334,7 +356,7 @@ def process_album_divide(duplicates, scrobble_info, cache, lastfm_artist, lastfm
 
     Args:
         duplicates: List of Navidrome track versions with 'id', 'album' fields
-        scrobble_info: Dict with 'timestamps' and 'album_orig' from Last.fm
+        scrobble_info: Dict with 'count' and 'album_orig' from Last.fm
         cache: ScrobbleCache instance (for fetching album scrobble counts)
         lastfm_artist: Last.fm artist name
         lastfm_track: Last.fm track name
@@ -349,24 +371,23 @@ def process_album_divide(duplicates, scrobble_info, cache, lastfm_artist, lastfm
     print(f"   Total scrobbles: {total_scrobbles}")
     print(f"   Navidrome versions:")
 
-    for idx, dup in enumerate(duplicates, 1):
-        album_name = dup['album'] if dup['album'] else "(No Album)"
+    album_names = [album_label(dup['album']) for dup in duplicates]
+    for idx, album_name in enumerate(album_names, 1):
         print(f"      [{idx}] {album_name}")
 
     if total_scrobbles <= 0:
         print(f"   ⚠️  Last.fm scrobbles don't have album information")
-        print(f"   → Dividing {len(scrobble_info['timestamps'])} scrobbles equally among {len(duplicates)} versions")
+        print(f"   → Dividing {scrobble_info['count']} scrobbles equally among {len(duplicates)} versions")
         distribution = calculate_album_divide(duplicates, scrobble_info)
     else:
         print(f"   Last.fm album counts:")
         for album, count in album_counts.items():
-            album_name = album if album else "(No Album)"
+            album_name = album_label(album)
             print(f"      {album_name}: {count} scrobbles")
 
         distribution = calculate_album_divide(duplicates, scrobble_info, album_counts=album_counts)
 
-    for dup in duplicates:
-        album_name = dup['album'] if dup['album'] else "(No Album)"
+    for dup, album_name in zip(duplicates, album_names):
         print(f"      {album_name}: {distribution[dup['id']]} scrobbles")
 
     return distribution
@@ -378,27 +399,19 @@ def prompt_user_for_duplicate_selection(duplicates, scrobble_info=None, album_ma
 
     Args:
         duplicates: List of dicts with Navidrome track info including 'id', 'album', 'artist', 'title'
-        scrobble_info: Optional dict with Last.fm scrobble info including 'timestamps'
+        scrobble_info: Optional dict with Last.fm scrobble info including 'count'
         album_maps: Optional dict mapping navidrome albums to last.fm albums for album-aware divide
 
     Returns:
-        Tuple of (selected_track_ids, distribution_dict) where distribution_dict is None unless
-        album-divide is used. selected_track_ids is None if user wants to skip all.
-        When album-divide is selected, returns (duplicates_list, scrobble_info) as a special marker.
+        SelectionResult with mode "skip" (ids None), "ids" (the selected track ids)
+        or "divide" (ids of all versions, divide_info set to scrobble_info)
     """
     print(f"\n⚠️  Multiple versions of the same track found in Navidrome:")
     print(f"   Track: {duplicates[0]['artist']} - {duplicates[0]['title']}")
     print(f"\n   Found in {len(duplicates)} different location(s):")
 
-    def format_duration(seconds):
-        if not seconds or seconds <= 0:
-            return "--:--"
-        minutes = int(seconds // 60)
-        secs = int(seconds % 60)
-        return f"{minutes}:{secs:02d}"
-
     for idx, dup in enumerate(duplicates, 1):
-        album_info = dup['album'] if dup['album'] else "(No Album)"
+        album_info = album_label(dup['album'])
 
         info_parts = []
         if dup.get('track_number'):
@@ -415,7 +428,7 @@ def prompt_user_for_duplicate_selection(duplicates, scrobble_info=None, album_ma
 
     print(f"   [A] Apply to ALL versions")
     if scrobble_info and len(duplicates) > 1:
-        total_scrobbles = len(scrobble_info.get('timestamps', []))
+        total_scrobbles = scrobble_info.get('count', 0)
         print(f"   [B] Album-aware divide (divide {total_scrobbles} scrobbles by album)")
     print(f"   [0] Skip all versions")
 
@@ -428,23 +441,23 @@ def prompt_user_for_duplicate_selection(duplicates, scrobble_info=None, album_ma
 
         if choice == '0':
             print(f"   ⏭️  Skipped all versions")
-            return None, None
+            return SelectionResult("skip", None, None)
 
         if choice == 'A':
             print(f"   ✅ Will update ALL versions")
-            return [dup['id'] for dup in duplicates], None
+            return SelectionResult("ids", [dup['id'] for dup in duplicates], None)
 
         if choice == 'B' and scrobble_info and len(duplicates) > 1:
             print(f"   📀 Album-aware divide selected")
-            return duplicates, scrobble_info  # special marker for album-divide
+            return SelectionResult("divide", [dup['id'] for dup in duplicates], scrobble_info)
 
         try:
             idx = int(choice)
             if 1 <= idx <= len(duplicates):
                 selected = duplicates[idx - 1]
-                album_name = selected['album'] if selected['album'] else "(No Album)"
+                album_name = album_label(selected['album'])
                 print(f"   ✅ Selected: {album_name}")
-                return [selected['id']], None
+                return SelectionResult("ids", [selected['id']], None)
         except ValueError:
             pass
 
@@ -467,7 +480,7 @@ def prompt_user_for_loved_selection(duplicates, starred_ids):
     print(f"\n   Found in {len(duplicates)} different location(s):")
 
     for idx, dup in enumerate(duplicates, 1):
-        album_info = dup['album'] if dup['album'] else "(No Album)"
+        album_info = album_label(dup['album'])
         star_marker = " ★" if dup['id'] in starred_ids else ""
         print(f"   [{idx}] {album_info}{star_marker}")
 
@@ -489,7 +502,7 @@ def prompt_user_for_loved_selection(duplicates, starred_ids):
             idx = int(choice)
             if 1 <= idx <= len(duplicates):
                 selected = duplicates[idx - 1]
-                album_name = selected['album'] if selected['album'] else "(No Album)"
+                album_name = album_label(selected['album'])
                 print(f"   ✅ Selected: {album_name}")
                 return [selected['id']]
         except ValueError:
@@ -518,14 +531,9 @@ def resolve_album_divide_selection(duplicates, scrobble_info, cache, lastfm_arti
         - album_divide_result: {track_id: count} dict when album-divide was used, else None
         - skip: True when the caller should skip to the next track (user cancelled)
     """
-    result, divide_info = prompt_user_for_duplicate_selection(duplicates, scrobble_info)
+    selection = prompt_user_for_duplicate_selection(duplicates, scrobble_info)
 
-    # Album-aware divide: result is the duplicates list, divide_info is scrobble_info
-    if (divide_info is not None
-            and isinstance(result, list)
-            and result
-            and isinstance(result[0], dict)
-            and 'id' in result[0]):
+    if selection.mode == "divide":
 
         album_counts = cache.get_album_scrobble_counts(lastfm_artist, lastfm_track)
         if album_counts:
@@ -553,7 +561,7 @@ def resolve_album_divide_selection(duplicates, scrobble_info, cache, lastfm_arti
                     )
                     return assignment_choice, manual_distribution, False
 
-        album_divide_result = process_album_divide(result, scrobble_info, cache, lastfm_artist, lastfm_track)
+        album_divide_result = process_album_divide(duplicates, scrobble_info, cache, lastfm_artist, lastfm_track)
         selected_ids = list(album_divide_result.keys())
         cache.save_duplicate_selection(
             lastfm_artist, lastfm_track, selected_ids,
@@ -561,8 +569,8 @@ def resolve_album_divide_selection(duplicates, scrobble_info, cache, lastfm_arti
         )
         return selected_ids, album_divide_result, False
 
-    if result:
-        cache.save_duplicate_selection(lastfm_artist, lastfm_track, result, mode="select")
-        return result, None, False
+    if selection.mode == "ids":
+        cache.save_duplicate_selection(lastfm_artist, lastfm_track, selection.ids, mode="select")
+        return selection.ids, None, False
 
     return None, None, False  # user chose to skip
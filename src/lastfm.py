@@ -1,16 +1,47 @@
 import requests
 import time
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from .config import LASTFM_API_KEY, LASTFM_API_SECRET, LASTFM_SESSION_KEY, LASTFM_USER
 
 MAX_RETRIES = 5
 RETRY_DELAY = 5
-REQUEST_DELAY = 0.2
+REQUEST_DELAY = 0.2  # Minimum spacing between Last.fm API calls (5 requests/second)
+LOVE_WORKERS = 5  # Concurrent track.love requests; the shared rate limiter still applies
+
+
+class RateLimiter:
+    """Space out calls to at most one per `interval` seconds, shared across threads.
+
+    Unlike a fixed sleep after every request, time already spent waiting on the
+    network counts towards the interval, so slow responses aren't padded further.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self):
+        """Block until the caller may make its next request."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+# One limiter for every Last.fm call this process makes
+_rate_limiter = RateLimiter(REQUEST_DELAY)
+
 
 def fetch_lastfm_page(url):
     """Fetch a single page from Last.fm API with retry logic."""
     for attempt in range(1, MAX_RETRIES + 1):
+        _rate_limiter.acquire()
         try:
             r = requests.get(url, timeout=10)
             if r.status_code == 200:
@@ -119,7 +150,6 @@ def fetch_all_lastfm_scrobbles(from_timestamp=0):
             break
         
         page += 1
-        time.sleep(REQUEST_DELAY)
     
     if pbar:
         pbar.close()
@@ -184,7 +214,6 @@ def fetch_loved_tracks():
             print(f"  Fetched {len(loved_tracks)} loved tracks from single page")
         
         page += 1
-        time.sleep(REQUEST_DELAY)
     
     if pbar:
         pbar.close()
@@ -301,6 +330,7 @@ def love_track(artist, track):
     params['api_sig'] = generate_api_signature(params, LASTFM_API_SECRET)
     params['format'] = 'json'
     
+    _rate_limiter.acquire()
     try:
         response = requests.post('http://ws.audioscrobbler.com/2.0/', data=params, timeout=10)
         data = response.json()
@@ -315,6 +345,24 @@ def love_track(artist, track):
         return False
 
 
+def love_tracks(tracks, max_workers=LOVE_WORKERS):
+    """
+    Mark many tracks as loved on Last.fm, with several requests in flight at once.
+    
+    Requests still go through the shared rate limiter, so this overlaps the
+    network round-trips without exceeding the API rate.
+    
+    Args:
+        tracks: Iterable of (artist, track) pairs
+        max_workers: Maximum number of concurrent requests
+    
+    Yields:
+        love_track() result for each pair, in input order
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(lambda pair: love_track(*pair), tracks)
+
+
 def unlove_track(artist, track):
     """
     Remove loved status from a track on Last.fm.
@@ -339,6 +387,7 @@ def unlove_track(artist, track):
     params['api_sig'] = generate_api_signature(params, LASTFM_API_SECRET)
     params['format'] = 'json'
     
+    _rate_limiter.acquire()
     try:
         response = requests.post('http://ws.audioscrobbler.com/2.0/', data=params, timeout=10)
         data = response.json()
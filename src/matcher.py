@@ -4,7 +4,8 @@ Handles variations like & vs 'and', special characters, etc.
 """
 
 import unicodedata
-from thefuzz import fuzz
+from functools import lru_cache
+from rapidfuzz import fuzz, process
 from typing import List, Dict, Optional, Tuple
 
 
@@ -37,11 +38,64 @@ def normalize_for_fuzzy_match(text: str) -> str:
     return text
 
 
+@lru_cache(maxsize=100_000)
+def _ratio(s1: str, s2: str, score_cutoff: float = 0) -> int:
+    """Similarity of two strings (0-100), rounded to a whole number like thefuzz's fuzz.ratio.
+
+    Scores below score_cutoff come back as 0; rapidfuzz skips pairs whose
+    lengths already rule the cutoff out and bounds the distance computation
+    for the rest.
+
+    Memoized: album versions and duplicates of a track compare the same
+    titles against the same Last.fm candidates again.
+    """
+    return int(round(fuzz.ratio(s1, s2, score_cutoff=score_cutoff)))
+
+
+def _min_track_score(artist_score: int, threshold: float) -> Optional[int]:
+    """Lowest whole track score whose combined score with artist_score reaches threshold.
+
+    Returns None when even a perfect track score would fall short.
+    """
+    track_score = max(0, int((threshold - artist_score * 0.3) / 0.7) - 1)
+    while track_score <= 100:
+        if (track_score * 0.7) + (artist_score * 0.3) >= threshold:
+            return track_score
+        track_score += 1
+    return None
+
+
+# Minimum artist similarity before a Last.fm artist's tracks are scored at all
+ARTIST_SCORE_THRESHOLD = 70
+# Raw rapidfuzz cutoff equivalent to ARTIST_SCORE_THRESHOLD after _ratio's rounding
+_ARTIST_SCORE_CUTOFF = ARTIST_SCORE_THRESHOLD - 0.5
+
+
+def build_fuzzy_index(aggregated_scrobbles: Dict) -> Dict[str, List[Tuple[int, str, Dict]]]:
+    """
+    Pre-normalize Last.fm scrobbles for fuzzy matching, grouped by artist.
+    
+    Built once per run so fuzzy lookups don't re-normalize every scrobble for
+    every Navidrome track.
+    
+    Returns:
+        Dict of {normalized_artist: [(position, normalized_track, scrobble_info), ...]},
+        where position is the scrobble's place in aggregated_scrobbles
+    """
+    index = {}
+    for position, scrobble_info in enumerate(aggregated_scrobbles.values()):
+        artist_norm = normalize_for_fuzzy_match(scrobble_info['artist_orig'])
+        track_norm = normalize_for_fuzzy_match(scrobble_info['track_orig'])
+        index.setdefault(artist_norm, []).append((position, track_norm, scrobble_info))
+    return index
+
+
 def find_fuzzy_matches_for_navidrome_track(
     navidrome_artist: str,
     navidrome_track: str,
     aggregated_scrobbles: Dict,
-    threshold: int = 85
+    threshold: int = 85,
+    fuzzy_index: Optional[Dict] = None
 ) -> List[Dict]:
     """
     Find potential fuzzy matches for a Navidrome track in Last.fm scrobbles.
@@ -51,46 +105,59 @@ def find_fuzzy_matches_for_navidrome_track(
         navidrome_track: Track name from Navidrome
         aggregated_scrobbles: Dict of aggregated Last.fm scrobbles {key: {info}}
         threshold: Minimum similarity score (0-100)
+        fuzzy_index: Optional prebuilt build_fuzzy_index(aggregated_scrobbles)
     
     Returns:
         List of potential matches with similarity scores, sorted by score (highest first)
     """
+    if fuzzy_index is None:
+        fuzzy_index = build_fuzzy_index(aggregated_scrobbles)
+    
     nav_artist_norm = normalize_for_fuzzy_match(navidrome_artist)
     nav_track_norm = normalize_for_fuzzy_match(navidrome_track)
     
     matches = []
     
-    for key, scrobble_info in aggregated_scrobbles.items():
-        lastfm_artist = scrobble_info['artist_orig']
-        lastfm_track = scrobble_info['track_orig']
-        
-        lastfm_artist_norm = normalize_for_fuzzy_match(lastfm_artist)
-        lastfm_track_norm = normalize_for_fuzzy_match(lastfm_track)
-        
-        # Calculate similarity scores
-        artist_score = fuzz.ratio(nav_artist_norm, lastfm_artist_norm)
-        track_score = fuzz.ratio(nav_track_norm, lastfm_track_norm)
-        
-        # Combined score (weighted average: track is more important)
-        combined_score = (track_score * 0.7) + (artist_score * 0.3)
+    # Score the Navidrome artist against every Last.fm artist in one rapidfuzz
+    # call; only reasonably similar artists have their tracks scored
+    artist_hits = process.extract(
+        nav_artist_norm,
+        fuzzy_index.keys(),
+        scorer=fuzz.ratio,
+        score_cutoff=_ARTIST_SCORE_CUTOFF,
+        limit=None
+    )
+    
+    for lastfm_artist_norm, raw_artist_score, _ in artist_hits:
+        artist_score = int(round(raw_artist_score))
+        min_track_score = _min_track_score(artist_score, threshold)
+        if min_track_score is None:
+            continue
+        # Anything rounding up to min_track_score counts, hence the half point
+        track_cutoff = max(0, min_track_score - 0.5)
         
-        # If both artist and track are reasonably similar
-        if combined_score >= threshold and artist_score >= 70:
-            matches.append({
-                'lastfm_artist': lastfm_artist,
-                'lastfm_track': lastfm_track,
-                'scrobble_count': len(scrobble_info['timestamps']),
-                'loved': scrobble_info['loved'],
-                'artist_score': artist_score,
-                'track_score': track_score,
-                'combined_score': combined_score,
-                'scrobble_info': scrobble_info
-            })
+        for position, lastfm_track_norm, scrobble_info in fuzzy_index[lastfm_artist_norm]:
+            track_score = _ratio(nav_track_norm, lastfm_track_norm, track_cutoff)
+            
+            # Combined score (weighted average: track is more important)
+            combined_score = (track_score * 0.7) + (artist_score * 0.3)
+            
+            if combined_score >= threshold:
+                matches.append((position, {
+                    'lastfm_artist': scrobble_info['artist_orig'],
+                    'lastfm_track': scrobble_info['track_orig'],
+                    'scrobble_count': scrobble_info['count'],
+                    'loved': scrobble_info['loved'],
+                    'artist_score': artist_score,
+                    'track_score': track_score,
+                    'combined_score': combined_score,
+                    'scrobble_info': scrobble_info
+                }))
     
-    # Sort by combined score (highest first)
-    matches.sort(key=lambda x: x['combined_score'], reverse=True)
+    # Sort by combined score (highest first); ties keep the scrobbles' original order
+    matches.sort(key=lambda x: (-x[1]['combined_score'], x[0]))
     
-    return matches
+    return [match for _, match in matches]
 
 
 def prompt_user_for_lastfm_match(
@@ -142,7 +209,9 @@ def get_lastfm_match_for_navidrome_track(
     auto_fuzzy_threshold: Optional[int] = None,
     enable_fuzzy: bool = True,
     album_aware: bool = False,
-    album_specific_keys: Optional[set] = None
+    album_specific_keys: Optional[set] = None,
+    fuzzy_index: Optional[Dict] = None,
+    saved_fuzzy_matches: Optional[Dict] = None
 ) -> Optional[Dict]:
     """
     Get the best Last.fm match for a Navidrome track.
@@ -160,11 +229,14 @@ def get_lastfm_match_for_navidrome_track(
         enable_fuzzy: Enable fuzzy matching (default: True)
         album_aware: Use album information in matching (default: False)
         album_specific_keys: Optional set of (artist_key, track_key) where Last.fm scrobbles have album info
+        fuzzy_index: Optional prebuilt build_fuzzy_index(aggregated_scrobbles), reused across tracks
+        saved_fuzzy_matches: Optional preloaded cache.get_fuzzy_matches_by_track_id(), used instead of
+            querying the cache for this track
 
     Returns:
         Dict with Last.fm scrobble info, or None if no match
     """
-    from .utils import make_key_navidrome, make_key_lastfm
+    from .utils import make_key_lastfm, navidrome_track_key, normalize
     
     navidrome_artist = navidrome_track['artist']
     navidrome_title = navidrome_track['title']
@@ -172,7 +244,10 @@ def get_lastfm_match_for_navidrome_track(
     navidrome_id = navidrome_track['id']
     
     # Check if we have a cached fuzzy match
-    cached_match = cache.get_fuzzy_match_for_navidrome_track(navidrome_id)
+    if saved_fuzzy_matches is not None:
+        cached_match = saved_fuzzy_matches.get(str(navidrome_id))
+    else:
+        cached_match = cache.get_fuzzy_match_for_navidrome_track(navidrome_id)
     if cached_match:
         # Look up the scrobble info using the cached Last.fm artist/track
         # Note: fuzzy matches don't include album info, so use album_aware=False
@@ -181,22 +256,27 @@ def get_lastfm_match_for_navidrome_track(
             return aggregated_scrobbles[key]
         # If cached Last.fm track no longer exists in scrobbles, fall through
     
+    # Album-agnostic artist/title key; album-aware keys extend it with the album
+    nav_key_agnostic = navidrome_track_key(navidrome_track)
+
     # Try exact match first (with album awareness if enabled)
-    exact_key = make_key_navidrome(navidrome_artist, navidrome_title, navidrome_album, album_aware)
+    if album_aware:
+        exact_key = nav_key_agnostic + (normalize(navidrome_album),)
+    else:
+        exact_key = nav_key_agnostic
     if exact_key in aggregated_scrobbles:
         return aggregated_scrobbles[exact_key]
     
     # If album-aware mode didn't find a match, be careful with fallbacks
     # Only fall back to album-agnostic matches when Last.fm provides no album info for this track
     if album_aware:
-        nav_key_agnostic = make_key_navidrome(navidrome_artist, navidrome_title, None, False)
         nav_artist_key = nav_key_agnostic[0]
         nav_title_key = nav_key_agnostic[1]
         has_album_specific = False
         if album_specific_keys is not None:
             has_album_specific = (nav_artist_key, nav_title_key) in album_specific_keys
 
-        empty_album_key = make_key_navidrome(navidrome_artist, navidrome_title, '', True)
+        empty_album_key = nav_key_agnostic + ('',)
         nav_album_clean = (navidrome_album or '').strip()
 
         # If Navidrome has no album, accept empty-album scrobbles
@@ -208,9 +288,8 @@ def get_lastfm_match_for_navidrome_track(
             if empty_album_key in aggregated_scrobbles:
                 return aggregated_scrobbles[empty_album_key]
 
-            album_agnostic_key = make_key_navidrome(navidrome_artist, navidrome_title, None, False)
-            if album_agnostic_key in aggregated_scrobbles:
-                return aggregated_scrobbles[album_agnostic_key]
+            if nav_key_agnostic in aggregated_scrobbles:
+                return aggregated_scrobbles[nav_key_agnostic]
 
         # Otherwise, don't force an album-agnostic match
         return None
@@ -224,7 +303,8 @@ def get_lastfm_match_for_navidrome_track(
         navidrome_artist,
         navidrome_title,
         aggregated_scrobbles,
-        threshold=fuzzy_threshold
+        threshold=fuzzy_threshold,
+        fuzzy_index=fuzzy_index
     )
     
     if not fuzzy_matches:
@@ -1,4 +1,7 @@
+import json
 import re
+import sys
+from functools import lru_cache
 from datetime import datetime, timezone
 
 from .config import FIRST_ARTIST_WHITELIST, SCROBBLED_FIRSTARTISTONLY, LASTFM_ARTIST_MAPPING
@@ -14,8 +17,30 @@ def apply_artist_mapping(artist):
         return artist
     return LASTFM_ARTIST_MAPPING.get(artist.strip().lower(), artist)
 
+# Whitelisted artist names as (lowercase, canonical) pairs, blanks dropped
+_FIRST_ARTIST_WHITELIST = [
+    (wl.lower(), wl)
+    for wl in ((w or "").strip() for w in FIRST_ARTIST_WHITELIST)
+    if wl
+]
+
+# Split on common separators (feat., &, +, ',', '/', '-', with, bullet point, etc.)
+# Use word boundaries for multi-letter separators to prevent matching inside artist names
+# Patterns ordered by actual frequency in database: &(112), feat(95), featuring(15), ft(10), and(8)
+# Allow optional space before separator, required space after
+_ARTIST_SEPARATOR_RE = re.compile(
+    r"\s*(\bfeat\.?|\bft\.?|\bfeaturing\b|&|\+|;|,|/|\-|\bvs\.?|\band\b|\bwith\b|"
+    r"\bmit\b|\bmet\b|\bx\b|\bremix\b|\bversus\b)\s+",
+    flags=re.IGNORECASE,
+)
+
+@lru_cache(maxsize=None)
 def first_artist(artist):
-    """Extract the primary artist from a collaboration string."""
+    """Extract the primary artist from a collaboration string.
+
+    Memoized: the same artist names come up for every track, key and report,
+    and the result only depends on config that is fixed for the run.
+    """
     if not artist:
         return ""
     artist_clean = artist.strip()
@@ -27,36 +52,47 @@ def first_artist(artist):
     # Exact match against whitelist (case-insensitive)
     # The whitelist is for artists you want preserved with specific casing
     artist_lower = artist_clean.lower()
-    for whitelisted in FIRST_ARTIST_WHITELIST:
-        wl = (whitelisted or "").strip()
-        if not wl:
-            continue
-        wl_lower = wl.lower()
+    for wl_lower, wl in _FIRST_ARTIST_WHITELIST:
         if artist_lower == wl_lower:
             return wl  # preserve canonical casing from whitelist
 
     # Prefix match against whitelist (case-insensitive)
     # Useful when tags include extra artists after a whitelisted entry
-    for whitelisted in FIRST_ARTIST_WHITELIST:
-        wl = (whitelisted or "").strip()
-        if not wl:
-            continue
-        wl_lower = wl.lower()
+    for wl_lower, wl in _FIRST_ARTIST_WHITELIST:
         if artist_lower.startswith(wl_lower):
             tail = artist_lower[len(wl_lower):]
             if not tail or not tail[0].isalnum():
                 return wl  # preserve canonical casing from whitelist
 
-    # Fallback: split on common separators (feat., &, +, ',', '/', '-', with, bullet point, etc.)
-    # Use word boundaries for multi-letter separators to prevent matching inside artist names
-    # Patterns ordered by actual frequency in database: &(112), feat(95), featuring(15), ft(10), and(8)
-    # Allow optional space before separator, required space after
-    sep_pattern = re.compile(
-        r"\s*(\bfeat\.?|\bft\.?|\bfeaturing\b|&|\+|;|,|/|\-|\bvs\.?|\band\b|\bwith\b|"
-        r"\bmit\b|\bmet\b|\bx\b|\bremix\b|\bversus\b)\s+",
-        flags=re.IGNORECASE,
-    )
-    return sep_pattern.split(artist_clean)[0].strip()
+    # Fallback: split on the first collaboration separator
+    return _ARTIST_SEPARATOR_RE.split(artist_clean, maxsplit=1)[0].strip()
+
+class OutputBuffer:
+    """Collect output lines and write them to stdout in batches.
+
+    Call flush() before anything that prompts the user so queued lines appear
+    ahead of the prompt.
+    """
+
+    def __init__(self, limit=500):
+        self.limit = limit
+        self._lines = []
+
+    def print(self, line=""):
+        self._lines.append(line)
+        if len(self._lines) >= self.limit:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            sys.stdout.write("\n".join(self._lines) + "\n")
+            sys.stdout.flush()
+            self._lines.clear()
+
+def write_json(path, data):
+    """Write data to path as UTF-8 JSON indented by 2 spaces, keeping non-ASCII characters as-is."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
 
 def make_key(artist, title):
     """Create a normalized key for matching artist/title combinations.
@@ -105,27 +141,52 @@ def make_key_navidrome(artist, title, album=None, album_aware=False):
         return (normalize(first_artist(artist)), normalize(title), normalize(album or ''))
     return (normalize(first_artist(artist)), normalize(title))
 
+def navidrome_track_key(track):
+    """Album-agnostic make_key_navidrome() key for a Navidrome track dict.
+    
+    Computed on first use and stored on the dict as '_norm_key', since the same
+    track is keyed by the prefilter, the matcher and the missing-tracks report.
+    Album-aware keys are this key plus normalize(album).
+    """
+    key = track.get('_norm_key')
+    if key is None:
+        key = track['_norm_key'] = make_key_navidrome(track['artist'], track['title'])
+    return key
+
 def aggregate_scrobbles(scrobbles, album_aware=False):
-    """Aggregate scrobbles by artist/track key with timestamps and loved status.
+    """Aggregate scrobbles by artist/track key with play count, last play and loved status.
     
     Args:
-        scrobbles: List of scrobble dicts from Last.fm
+        scrobbles: Iterable of scrobble dicts from Last.fm, newest first. Entries may
+            carry a 'count' to stand for that many scrobbles with 'timestamp' the
+            latest of them, as yielded by ScrobbleCache.iter_scrobble_groups()
         album_aware: If True, aggregate by artist/track/album instead of just artist/track
+    
+    Only the scrobble count and the latest timestamp ('count', 'last_ts') are kept
+    per key, since nothing downstream needs the individual scrobble times.
     """
     aggregated = {}
     for s in scrobbles:
         artist = apply_artist_mapping(s['artist'])
         key = make_key_lastfm(artist, s['track'], s.get('album', ''), album_aware)
-        aggregated.setdefault(key, {
-            'timestamps': [],
-            'loved': False,
-            'artist_orig': artist,
-            'track_orig': s['track'],
-            'album_orig': s.get('album', '')
-        })
-        aggregated[key]['timestamps'].append(s['timestamp'])
+        timestamp = s['timestamp']
+        info = aggregated.get(key)
+        if info is None:
+            # Artist and album names repeat across many tracks; interning shares one
+            # string object per name, and the duplicate keys built from them later
+            info = aggregated[key] = {
+                'count': 0,
+                'last_ts': timestamp,
+                'loved': False,
+                'artist_orig': sys.intern(artist),
+                'track_orig': s['track'],
+                'album_orig': sys.intern(s.get('album', ''))
+            }
+        info['count'] += s.get('count', 1)
+        if timestamp > info['last_ts']:
+            info['last_ts'] = timestamp
         if s['loved']:
-            aggregated[key]['loved'] = True
+            info['loved'] = True
     return aggregated
 
 def group_missing_by_artist_album(aggregated_scrobbles, tracks, cache, album_aware=False):
@@ -133,19 +194,24 @@ def group_missing_by_artist_album(aggregated_scrobbles, tracks, cache, album_awa
     
     Args:
         aggregated_scrobbles: Dict of Last.fm scrobbles aggregated by artist/track or artist/track/album
-        tracks: List of Navidrome tracks
+        tracks: Iterable of Navidrome tracks (consumed once)
         cache: ScrobbleCache instance to check for fuzzy match mappings
         album_aware: Whether album information was used in aggregation keys
     
     Returns:
         Tuple of (missing_scrobbles_grouped, missing_loved_grouped)
     """
-    nav_keys = set(make_key_navidrome(t['artist'], t['title'], t.get('album'), album_aware) for t in tracks)
-    
-    # Pre-compute album-agnostic keys once for performance (avoid O(n²) in loop)
-    nav_keys_album_agnostic = set(
-        make_key_navidrome(t['artist'], t['title'], None, False) for t in tracks
-    ) if album_aware else set()
+    # Build the Navidrome key sets in a single pass; in album-aware mode the
+    # album-agnostic key is the same artist/title with the album dropped
+    nav_keys = set()
+    nav_keys_album_agnostic = set()
+    for t in tracks:
+        key = navidrome_track_key(t)
+        if album_aware:
+            nav_keys.add(key + (normalize(t.get('album')),))
+            nav_keys_album_agnostic.add(key)
+        else:
+            nav_keys.add(key)
     
     # Get all fuzzy match mappings to check if Last.fm tracks are matched
     fuzzy_matches = cache.get_all_fuzzy_matches()
@@ -185,8 +251,8 @@ def group_missing_by_artist_album(aggregated_scrobbles, tracks, cache, album_awa
         artist = info['artist_orig']
         track = info['track_orig']
         album = info['album_orig'] or ""
-        scrobble_count = len(info['timestamps'])
-        last_played_ts = max(info['timestamps'])
+        scrobble_count = info['count']
+        last_played_ts = info['last_ts']
         last_played_str = datetime.fromtimestamp(
             last_played_ts, timezone.utc
         ).strftime("%Y-%m-%d %H:%M:%S")